@@ -8,4 +8,7 @@ class WrongMetafileException(CustomException):
     pass
 
 class WrongDataFileException(CustomException):
-    pass
\ No newline at end of file
+    pass
+
+class WrongConfigException(CustomException):
+    pass
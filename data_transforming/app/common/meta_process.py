@@ -1,7 +1,8 @@
 from datetime import datetime
+import json
 import pandas as pd
 from .s3 import S3BucketConnector
-from .custom_exceptions import WrongMetafileException
+from .custom_exceptions import WrongMetafileException, WrongConfigException
 import collections
 from logging import Logger
 
@@ -9,7 +10,8 @@ from logging import Logger
 class MetaProcess():
 
     @staticmethod
-    def update_meta_file(bucket: S3BucketConnector, logger: Logger, metafile_key: str, transformed_files: list) -> None:
+    def update_meta_file(bucket: S3BucketConnector, logger: Logger, metafile_key: str, transformed_files: list, watermark_key: str='',
+                        pending_files: list=None) -> None:
         df_new = pd.DataFrame(columns=['file_name', 'datetime_of_processing'])
         df_new['file_name'] = transformed_files
         df_new['datetime_of_processing'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
@@ -22,10 +24,73 @@ class MetaProcess():
         except bucket.session.client('s3').exceptions.NoSuchKey:
             df_all = df_new
         bucket.write_df_to_s3(df_all, metafile_key)
+        if watermark_key and transformed_files:
+            MetaProcess.update_watermark(bucket, watermark_key, transformed_files, pending_files or [])
 
 
+    # Watermark is the last transformed key. Keys of the data files contain the time of scraping, so new files
+    # have keys after the watermark. Files after the watermark which were already transformed (committed while
+    # an earlier file was still pending) are stored with it, so they are not transformed again.
     @staticmethod
-    def get_files_to_transform(bucket: S3BucketConnector, logger: Logger, metafile_key: str, data_files_source_path: str) -> list:
+    def get_watermark(bucket: S3BucketConnector, watermark_key: str) -> tuple[str, set]:
+        try:
+            df = bucket.read_s3_to_df(watermark_key)
+        except bucket.session.client('s3').exceptions.NoSuchKey:
+            return None, set()
+        transformed_after = df['transformed_after'].iloc[0] if 'transformed_after' in df.columns else None
+        if transformed_after is None or pd.isna(transformed_after):
+            return df['last_key'].iloc[0], set()
+        return df['last_key'].iloc[0], set(json.loads(transformed_after))
+
+
+    @staticmethod
+    def check_discovery_config(logger: Logger, discovery: str, watermark_key: str) -> None:
+        if discovery not in ('full', 'watermark'):
+            logger.error(f"Discovery mode '{discovery}' is not supported, use 'full' or 'watermark'.")
+            raise WrongConfigException
+        if discovery == 'watermark' and not watermark_key:
+            logger.error("Discovery mode 'watermark' requires watermark_key to be set.")
+            raise WrongConfigException
+
+
+    # Files are committed one by one, so the watermark is advanced only over the transformed keys before
+    # the first pending file. Otherwise a failed run would leave an earlier file behind the watermark.
+    @staticmethod
+    def update_watermark(bucket: S3BucketConnector, watermark_key: str, transformed_files: list, pending_files: list) -> None:
+        watermark, transformed_after = MetaProcess.get_watermark(bucket, watermark_key)
+        transformed_after = transformed_after | set(transformed_files)
+        pending_after = [key for key in pending_files if watermark is None or key > watermark]
+        first_pending = min(pending_after) if pending_after else None
+        last_keys = [key for key in transformed_after if first_pending is None or key < first_pending]
+        if watermark is not None:
+            last_keys.append(watermark)
+        if not last_keys:
+            return
+        last_key = max(last_keys)
+        transformed_after = sorted(key for key in transformed_after if key > last_key)
+        df = pd.DataFrame({'last_key': [last_key], 'transformed_after': [json.dumps(transformed_after)],
+                        'datetime_of_processing': [datetime.today().strftime('%Y-%m-%d %H:%M:%S')]})
+        bucket.write_df_to_s3(df, watermark_key)
+
+
+    # In the 'watermark' discovery mode only keys after the watermark are listed and the metafile is not read,
+    # so the cost does not grow with the history of the bucket. The 'full' mode (reconciliation) lists all keys
+    # and transforms those missing from the metafile, e.g. files with keys older than the watermark.
+    # The watermark assumes that the transformer never runs while the scraper is writing data files: a file
+    # published after the transform with a key older than the watermark (time of its scraping start) would be
+    # skipped. The pipeline DAG runs the transform after all scraper pods and never overlaps runs.
+    @staticmethod
+    def get_files_to_transform(bucket: S3BucketConnector, logger: Logger, metafile_key: str, data_files_source_path: str,
+                            discovery: str='full', watermark_key: str='') -> list:
+        MetaProcess.check_discovery_config(logger, discovery, watermark_key)
+        if discovery == 'watermark':
+            watermark, transformed_after = MetaProcess.get_watermark(bucket, watermark_key)
+            if watermark is not None:
+                files_to_transform = set(bucket.get_prefix_keys_after(data_files_source_path, watermark)) - transformed_after
+                logger.info(f'{len(files_to_transform)} new files were found after {watermark}.')
+                return sorted(files_to_transform)
+            logger.info('There is no watermark yet, files to transform are found by comparing all files with the metafile.')
+
         try:
             meta_df = bucket.read_s3_to_df(metafile_key)
             meta_names = set(meta_df['file_name'])
@@ -37,7 +102,4 @@ class MetaProcess():
         
         
         files_to_transform = all_file_names - meta_names
-        files_to_transform = list(files_to_transform)
-        #files_to_transform.sort(reverse=False)
-        
-        return files_to_transform
\ No newline at end of file
+        return sorted(files_to_transform)
\ No newline at end of file
@@ -14,14 +14,27 @@ class RedshiftConnector():
             database=os.environ[database],
             user=os.environ[user],
             password=os.environ[password])
+        self.placeholder = '%s'
+
+
+    # Connector of an open DB-API connection, e.g. to a local PostgreSQL or DuckDB database standing in for Redshift
+    # in tests. Placeholder is the parameter marker of the driver ('%s' or '?').
+    @classmethod
+    def from_connection(cls, connection, placeholder: str='%s') -> 'RedshiftConnector':
+        redshift = cls.__new__(cls)
+        redshift.connector = connection
+        redshift.placeholder = placeholder
+        return redshift
     
 
-    def get_source_table(self, source_table_name: str) -> pd.DataFrame:
-        cursor = self.connector.cursor().execute(f'SELECT * FROM {source_table_name}')
+    # Only the given columns are selected if columns are set
+    def get_source_table(self, source_table_name: str, columns: list=None) -> pd.DataFrame:
+        selected_columns = ', '.join(columns) if columns else '*'
+        cursor = self.connector.cursor().execute(f'SELECT {selected_columns} FROM {source_table_name}')
         source_table = cursor.fetch_dataframe()
 
         if source_table is None:
-            column_list = self.get_source_table_columns(source_table_name)
+            column_list = columns or self.get_source_table_columns(source_table_name)
             source_table = pd.DataFrame(columns=column_list)
         
         return source_table
@@ -31,9 +44,7 @@ class RedshiftConnector():
         query_statement = "SELECT column_name FROM information_schema.columns "\
                           f"WHERE table_name = '{source_table_name}' "\
                           "ORDER by ordinal_position;"
-        cursor = self.connector.cursor().execute(query_statement)
-        source_table = cursor.fetch_dataframe()
-        column_list = source_table['column_name'].values.tolist()
+        column_list = [row[0] for row in self.fetch_rows(query_statement)]
 
         return column_list
 
@@ -41,16 +52,48 @@ class RedshiftConnector():
     def get_source_table_last_key(self, source_table_name: str, surrogate_key: str) -> int:
         query_statement = f"SELECT {surrogate_key} FROM {source_table_name} "\
                           f"ORDER BY {surrogate_key} DESC LIMIT 1"
-        cursor = self.connector.cursor().execute(query_statement)
-        source_table = cursor.fetch_dataframe()
+        rows = self.fetch_rows(query_statement)
 
-        if source_table is None:
+        if not rows:
             return 0
         else:
-            last_key = source_table.iloc[0, 0]
+            last_key = rows[0][0]
             return last_key
 
 
+    # Surrogate keys of the natural keys found in the table. Only the natural keys are sent (to a temporary staging
+    # table) and only the matched pairs are fetched, so the transfer depends on the number of keys, not the table size.
+    # Rows with null natural key are fetched if include_nulls is set, since nulls do not match in the join.
+    def lookup_keys(self, table_name: str, natural_key: str, surrogate_key: str, keys: list, batch_size: int=1000,
+                    include_nulls: bool=False) -> pd.DataFrame:
+        staging_table = f'staging_{table_name}_keys'
+        cursor = self.connector.cursor()
+        cursor.execute(f'DROP TABLE IF EXISTS {staging_table}')
+        # Staging column has the type of the natural key column
+        cursor.execute(f'CREATE TEMP TABLE {staging_table} AS SELECT {natural_key} FROM {table_name} WHERE 1 = 0')
+        for first_key in range(0, len(keys), batch_size):
+            batch = keys[first_key:first_key + batch_size]
+            values = ', '.join([f'({self.placeholder})'] * len(batch))
+            cursor.execute(f'INSERT INTO {staging_table} ({natural_key}) VALUES {values}', batch)
+
+        query_statement = f'SELECT dim.{surrogate_key}, dim.{natural_key} FROM {table_name} dim '\
+                          f'JOIN {staging_table} staging ON dim.{natural_key} = staging.{natural_key}'
+        if include_nulls:
+            query_statement += f' UNION ALL SELECT {surrogate_key}, {natural_key} FROM {table_name} WHERE {natural_key} IS NULL'
+        cursor.execute(query_statement)
+        pairs = pd.DataFrame(cursor.fetchall(), columns=[surrogate_key, natural_key])
+        cursor.execute(f'DROP TABLE {staging_table}')
+
+        return pairs
+
+
+    # Plain DB-API fetch, which works with every driver
+    def fetch_rows(self, query_statement: str) -> list:
+        cursor = self.connector.cursor()
+        cursor.execute(query_statement)
+        return cursor.fetchall()
+
+
     def write_dataframe(self, df: pd.DataFrame, table_name: str) -> None:
         self.connector.cursor().write_dataframe(df, table_name)
 
@@ -1,6 +1,8 @@
 import boto3
 import pandas as pd
-from io import BytesIO, StringIO
+import pyarrow.parquet as pq
+from io import BytesIO, StringIO, RawIOBase
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
 from .custom_exceptions import WrongFileFormat
@@ -14,13 +16,15 @@ class S3BucketConnector():
         self.logger = logging.getLogger(__name__)
         self._s3 = self.session.resource(service_name='s3', endpoint_url=endpoint_url)
         self._bucket = self._s3.Bucket(bucket_name)
+        # Unlike resources, clients can be shared by threads
+        self._client = self._s3.meta.client
         self.dwh_tables_target_path = dwh_tables_target_path
         self.target_format = target_format
 
 
-    def write_df_to_s3(self, df: pd.DataFrame, key: str, dwh_table: bool=False) -> None:
+    def write_df_to_s3(self, df: pd.DataFrame, key: str, dwh_table: bool=False, part: int=None) -> None:
         if dwh_table:
-            key = self.generate_file_key(key)
+            key = self.generate_file_key(key, part)
 
         format_position = key.rfind('.') + 1
         file_format = key[format_position:]
@@ -38,15 +42,25 @@ class S3BucketConnector():
         self._bucket.put_object(Body=out_buffer.getvalue(), Key=key)
 
 
-    def read_s3_to_df(self, key: str, decoding='utf-8', sep=',') -> pd.DataFrame:
+    def read_s3_to_bytes(self, key: str, byte_range: str=None) -> bytes:
+        if byte_range is None:
+            return self._client.get_object(Bucket=self._bucket.name, Key=key)['Body'].read()
+        return self._client.get_object(Bucket=self._bucket.name, Key=key, Range=byte_range)['Body'].read()
+
+
+    # Only the given columns are read if columns are set. Parquet columns are then read with ranged GETs
+    # of their column chunks, so the other columns are not downloaded.
+    def read_s3_to_df(self, key: str, decoding='utf-8', sep=',', columns: list=None) -> pd.DataFrame:
         format_position = key.rfind('.') + 1
         file_format = key[format_position:]
         if file_format == 'csv':
-            csv_file = self._bucket.Object(key=key).get().get('Body').read().decode(decoding)
+            csv_file = self.read_s3_to_bytes(key).decode(decoding)
             data = StringIO(csv_file)
-            df = pd.read_csv(data, delimiter=sep)
+            df = pd.read_csv(data, delimiter=sep, usecols=columns)
+        elif file_format == 'parquet' and columns is not None:
+            df = self.open_s3_parquet(key).read(columns=columns, use_pandas_metadata=True).to_pandas()
         elif file_format == 'parquet':
-            parquet_file = self._bucket.Object(key=key).get().get('Body').read()
+            parquet_file = self.read_s3_to_bytes(key)
             data = BytesIO(parquet_file)
             df = pd.read_parquet(data)
         else:
@@ -55,9 +69,41 @@ class S3BucketConnector():
             
         return df
 
+
+    # Reads the files by max_workers threads, dataframes are returned in the order of keys
+    def read_s3_files_to_dfs(self, keys: list, columns: list=None, max_workers: int=8) -> list:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return list(executor.map(lambda key: self.read_s3_to_df(key, columns=columns), keys))
+
+
+    # Parquet file which reads the footer and column chunks with ranged GETs (adjacent chunks are coalesced)
+    def open_s3_parquet(self, key: str) -> pq.ParquetFile:
+        return pq.ParquetFile(S3ObjectFile(self, key), pre_buffer=True)
+
+
+    # Column names of the files without downloading their data: parquet schema is read from the footer,
+    # csv header from the first bytes of the file
+    def read_s3_columns(self, keys: list, max_workers: int=8) -> list:
+        def read_columns(key: str) -> list:
+            if key.endswith('.parquet'):
+                schema = self.open_s3_parquet(key).schema_arrow
+                index_columns = (schema.pandas_metadata or {}).get('index_columns', [])
+                return [name for name in schema.names if name not in index_columns]
+            elif key.endswith('.csv'):
+                header = self.read_s3_to_bytes(key, 'bytes=0-65535').decode('utf-8', errors='ignore')
+                return list(pd.read_csv(StringIO(header.split('\n', 1)[0]), nrows=0).columns)
+            self.logger.error(f"The file format of '{key}' is not supported to be read from s3.")
+            raise WrongFileFormat
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return list(executor.map(read_columns, keys))
+
     
-    def generate_file_key(self, table_name: str) -> str:
+    # Tables exported in parts (e.g. per chunk of streamed data) get the part number in the key
+    def generate_file_key(self, table_name: str, part: int=None) -> str:
         today_date = datetime.today().strftime('%Y%m%d_%H%M%S')
+        if part is not None:
+            today_date = f'{today_date}_part{part:04d}'
         key = f'{self.dwh_tables_target_path}{table_name}/{table_name}_{today_date}.{self.target_format}'
         return key
 
@@ -65,3 +111,71 @@ class S3BucketConnector():
     def get_prefix_files(self, prefix: str) -> list:
         return self._bucket.objects.filter(Prefix=prefix)
 
+
+    # Keys under the prefix which are after start_after in lexicographic order, only those are listed
+    def get_prefix_keys_after(self, prefix: str, start_after: str) -> list:
+        keys = []
+        paginator = self._client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self._bucket.name, Prefix=prefix, StartAfter=start_after):
+            keys += [obj['Key'] for obj in page.get('Contents', [])]
+        return keys
+
+
+    # ETags identify the content of the objects (without downloading them)
+    def get_etags(self, keys: list, max_workers: int=8) -> list:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return list(executor.map(lambda key: self._client.head_object(Bucket=self._bucket.name, Key=key)['ETag'], keys))
+
+
+    def delete_objects(self, keys: list) -> None:
+        # At most 1000 keys can be deleted by one request
+        for first_key in range(0, len(keys), 1000):
+            self._bucket.delete_objects(Delete={'Objects': [{'Key': key} for key in keys[first_key:first_key + 1000]]})
+
+
+
+
+# Read-only seekable file of an S3 object, every read is a ranged GET
+class S3ObjectFile(RawIOBase):
+    def __init__(self, bucket: S3BucketConnector, key: str) -> None:
+        self.bucket = bucket
+        self.key = key
+        self.size = bucket._client.head_object(Bucket=bucket._bucket.name, Key=key)['ContentLength']
+        self.position = 0
+
+
+    def readable(self) -> bool:
+        return True
+
+
+    def seekable(self) -> bool:
+        return True
+
+
+    def tell(self) -> int:
+        return self.position
+
+
+    def seek(self, offset: int, whence: int=0) -> int:
+        if whence == 0:
+            self.position = offset
+        elif whence == 1:
+            self.position += offset
+        else:
+            self.position = self.size + offset
+        return self.position
+
+
+    def read(self, size: int=-1) -> bytes:
+        end = self.size if size is None or size < 0 else min(self.size, self.position + size)
+        if self.position >= end:
+            return b''
+        data = self.bucket.read_s3_to_bytes(self.key, f'bytes={self.position}-{end - 1}')
+        self.position += len(data)
+        return data
+
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
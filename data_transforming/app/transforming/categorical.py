@@ -0,0 +1,51 @@
+from pandas.api.types import is_string_dtype
+from logging import Logger
+import pandas as pd
+
+
+# Low-cardinality string columns are kept as categorical dtype, which stores every distinct value once
+# and compares, copies and merges integer codes instead of Python strings
+class CategoricalColumns():
+    # Converts the columns (those present in df) to categorical dtype
+    @staticmethod
+    def convert(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+        for column in columns:
+            if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        return df
+
+
+    # Categorical columns with different categories would be concatenated into object columns,
+    # so all frames get the union of the categories first
+    @staticmethod
+    def concat(frames: list) -> pd.DataFrame:
+        for column in frames[0].columns:
+            if all(isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+                categories = frames[0][column].cat.categories
+                for frame in frames[1:]:
+                    categories = categories.union(frame[column].cat.categories, sort=False)
+                for frame in frames:
+                    frame[column] = frame[column].cat.set_categories(categories)
+        return pd.concat(frames)
+
+
+    # Strips whitespaces of the categories instead of every value, missing values are not in the mapping and stay missing
+    @staticmethod
+    def strip(df: pd.DataFrame) -> pd.DataFrame:
+        for column in df.select_dtypes(['category']).columns:
+            categories = df[column].cat.categories
+            if is_string_dtype(categories):
+                df[column] = df[column].map(dict(zip(categories, categories.str.strip()))).astype('category')
+        return df
+
+
+    # Logs memory of the categorical columns and of the same columns stored as strings
+    @staticmethod
+    def log_memory(df: pd.DataFrame, logger: Logger, stage: str) -> None:
+        columns = df.select_dtypes(['category']).columns
+        if len(columns) == 0:
+            return
+        memory = sum(df[column].memory_usage(deep=True, index=False) for column in columns)
+        string_memory = sum(df[column].astype(object).memory_usage(deep=True, index=False) for column in columns)
+        logger.info(f'Categorical columns after {stage}: {memory/1024/1024:.1f} MB instead of {string_memory/1024/1024:.1f} MB '
+                    f'as strings ({(string_memory - memory)/1024/1024:.1f} MB saved).')
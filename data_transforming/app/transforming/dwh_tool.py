@@ -1,6 +1,9 @@
 from ..common.redshift import RedshiftConnector
 from ..common.s3 import S3BucketConnector
 from ..common.meta_process import MetaProcess
+from .categorical import CategoricalColumns
+from .key_cache import DimensionKeyCache
+from ..common.custom_exceptions import WrongConfigException
 import pandas as pd
 import logging
 
@@ -11,18 +14,37 @@ class DataWarehouseTool():
                 transformed_files: str, metafile_key: str,
                 fact_table_name: str, fact_table_key: str, 
                 one_to_many_template: list, many_to_many_template: list, 
-                one_to_many_dims: list, many_to_many_dims: list) -> None:
+                one_to_many_dims: list, many_to_many_dims: list, watermark_key: str='',
+                key_cache: DimensionKeyCache=None, push_down_key_lookup: bool=False) -> None:
         self.logger = logging.getLogger(__name__)
         self.redshift = redshift
         self.bucket = bucket
         self.transformed_files = transformed_files
+        # Files of the run which are not committed yet, the watermark is not advanced past them
+        self.pending_files = set(transformed_files)
         self.metafile_key = metafile_key
+        self.watermark_key = watermark_key
         self.fact_table_name = fact_table_name
         self.fact_table_key = fact_table_key
 
         # Adds keys to elements in each list (of lists) according to the templates
         self.one_to_many = [dict(zip(one_to_many_template, dim)) for dim in one_to_many_dims]
         self.many_to_many = [dict(zip(many_to_many_template, dim)) for dim in many_to_many_dims]
+
+        # Keys of the tables are read from the key cache (if any) instead of Redshift
+        self.key_cache = key_cache
+        if self.key_cache is not None:
+            for keys_list in self.one_to_many + self.many_to_many:
+                self.key_cache.register(keys_list['dim_table'], [keys_list['surrogate_key'], keys_list['natural_key']], keys_list['surrogate_key'])
+            for keys_list in self.many_to_many:
+                self.key_cache.register(keys_list['br_table'], [keys_list['group_key'], keys_list['surrogate_key']], keys_list['group_key'])
+            self.key_cache.register(self.fact_table_name, [], self.fact_table_key)
+        # Without the key cache, keys of one-to-many dimensions can be looked up in the warehouse
+        # instead of reading the whole dimensions
+        if push_down_key_lookup and self.key_cache is not None:
+            self.logger.error('push_down_key_lookup cannot be used together with the key cache, disable one of them.')
+            raise WrongConfigException
+        self.push_down_key_lookup = push_down_key_lookup
     
 
     # Main function
@@ -34,6 +56,41 @@ class DataWarehouseTool():
             return
 
         self.logger.info('Creating fact and dimension tables.')
+        self.load_key_cache()
+        fact_rows, new_dims_data = self.load_chunk(df)
+        self.commit_files(self.transformed_files)
+        self.log_result(fact_rows, new_dims_data)
+
+
+    # Streaming version of the main function. Chunks are (df, completed_files) pairs yielded by the transformer.
+    # Every chunk is loaded in the open transaction, which is committed together with the metafile update once
+    # all chunks of a file were loaded, so an interrupted run leaves no partially loaded file behind.
+    def generate_facts_and_dims_streaming(self, chunks) -> None:
+        fact_rows = 0
+        new_dims_data = {}
+        part = 0
+        for df, completed_files in chunks:
+            if df is not None and not df.empty:
+                self.load_key_cache()
+                part += 1
+                self.logger.info(f'Creating fact and dimension tables of chunk {part} ({len(df.index)} rows).')
+                chunk_fact_rows, chunk_dims_data = self.load_chunk(df, part)
+                fact_rows += chunk_fact_rows
+                for table, rows in chunk_dims_data.items():
+                    new_dims_data[table] = new_dims_data.get(table, 0) + rows
+            if completed_files:
+                self.commit_files(completed_files)
+
+        if part == 0:
+            if self.transformed_files:
+                self.logger.warning('The transformed data is empty. No data was loaded to the database.')
+            return
+        self.log_result(fact_rows, new_dims_data)
+
+
+    # Loads facts and dimensions of df to Redshift (without commit) and exports them to S3.
+    # Returns number of fact rows and numbers of new rows of dimension/bridge tables.
+    def load_chunk(self, df: pd.DataFrame, part: int=None) -> tuple[int, dict]:
         new_dims_data = {}
         s3_export_tables = []
 
@@ -43,7 +100,7 @@ class DataWarehouseTool():
             df = new_df.copy()
             if not dim.empty: 
                 s3_export_tables.append([dim, keys_list['dim_table']])
-                self.redshift.write_dataframe(dim, keys_list['dim_table'])
+                self.write_table(dim, keys_list['dim_table'])
                 new_dims_data[keys_list['dim_table']] = len(dim.index)
         
 
@@ -54,27 +111,60 @@ class DataWarehouseTool():
             df = new_df.copy()
             if not dim.empty: 
                 s3_export_tables.append([dim, keys_list['dim_table']])
-                self.redshift.write_dataframe(dim, keys_list['dim_table'])
+                self.write_table(dim, keys_list['dim_table'])
                 new_dims_data[keys_list['dim_table']] = len(dim.index)
             if not br.empty: 
                 s3_export_tables.append([br, keys_list['br_table']])
-                self.redshift.write_dataframe(br, keys_list['br_table'])
+                self.write_table(br, keys_list['br_table'])
                 new_dims_data[keys_list['br_table']] = len(br.index)
         
 
+        CategoricalColumns.log_memory(df, self.logger, 'dimension keys')
         df = self.set_fact_columns(df)
         s3_export_tables.append([df, 'fact_salary'])
         self.redshift.write_dataframe(df, 'fact_salary')
+        if self.key_cache is not None:
+            self.key_cache.add(self.fact_table_name, df)
 
         
-        # Load new tables to S3 and Redshift and update metafile
+        # Load new tables to S3, chunks are exported as separate parts
         for table in s3_export_tables:
-            self.bucket.write_df_to_s3(table[0], table[1], True)
+            self.bucket.write_df_to_s3(table[0], table[1], True, part)
+
+        return len(df.index), new_dims_data
+
+
+    def commit_files(self, files: list) -> None:
+        if self.key_cache is not None:
+            self.key_cache.save_pending()
         self.redshift.commit()
-        MetaProcess.update_meta_file(self.bucket, self.logger, self.metafile_key, self.transformed_files)
+        if self.key_cache is not None:
+            self.key_cache.mark_committed()
+        self.pending_files -= set(files)
+        MetaProcess.update_meta_file(self.bucket, self.logger, self.metafile_key, files, self.watermark_key, sorted(self.pending_files))
+
 
+    def load_key_cache(self) -> None:
+        if self.key_cache is not None and not self.key_cache.loaded:
+            self.key_cache.load()
 
-        message = f'Job finished. {len(df.index)} new rows were loaded to the fact table.'
+
+    def write_table(self, table: pd.DataFrame, table_name: str) -> None:
+        self.redshift.write_dataframe(table, table_name)
+        if self.key_cache is not None:
+            self.key_cache.add(table_name, table)
+
+
+    # Returns the source table (only its key columns if the key cache is used) and names of all its columns
+    def get_source_table(self, table_name: str) -> tuple[pd.DataFrame, list]:
+        if self.key_cache is not None:
+            return self.key_cache.get_table(table_name), self.key_cache.get_columns(table_name)
+        source_table = self.redshift.get_source_table(table_name)
+        return source_table, list(source_table.columns)
+
+
+    def log_result(self, fact_rows: int, new_dims_data: dict) -> None:
+        message = f'Job finished. {fact_rows} new rows were loaded to the fact table.'
         if new_dims_data:
             message += f' Additionally new rows to the following dimension/bridge tables were loaded: {str(new_dims_data)[1:-1]}.'
         self.logger.info(message)
@@ -82,23 +172,42 @@ class DataWarehouseTool():
     
     # Returns dimnesion table with new values (if any) and df with foreign keys to the dimension
     def get_fact_dim(self, df, source_dim_name, natural_key: str, surrogate_key: str) -> tuple[pd.DataFrame, pd.DataFrame]:
-        source_dim = self.redshift.get_source_table(source_dim_name)
-        current_dim = self.create_new_dim(df, source_dim, natural_key, surrogate_key)
-        fact = pd.merge(df, current_dim[[natural_key, surrogate_key]], on=natural_key,how='left')
+        if self.push_down_key_lookup:
+            source_dim, dim_columns, last_key = self.lookup_source_keys(df, source_dim_name, natural_key, surrogate_key)
+        else:
+            source_dim, dim_columns = self.get_source_table(source_dim_name)
+            last_key = None
+        current_dim = self.create_new_dim(df, source_dim, natural_key, surrogate_key, columns=dim_columns, last_key=last_key)
+        fact = self.merge_keys(df, current_dim[[natural_key, surrogate_key]], natural_key)
         dim = self.get_table_with_new_values(current_dim, source_dim, surrogate_key)
 
         return fact, dim
 
 
+    # Returns keys of the source dimension matching natural keys of df (joined in the warehouse), names of
+    # the dimension columns and the last surrogate key of the dimension
+    def lookup_source_keys(self, df: pd.DataFrame, source_dim_name: str, natural_key: str, surrogate_key: str) -> tuple[pd.DataFrame, list, int]:
+        keys = df[natural_key].dropna().drop_duplicates()
+        if pd.api.types.is_datetime64_any_dtype(keys):
+            keys = keys.dt.date
+        source_dim = self.redshift.lookup_keys(source_dim_name, natural_key, surrogate_key, keys.tolist(),
+                                            include_nulls=df[natural_key].isna().any())
+        dim_columns = self.redshift.get_source_table_columns(source_dim_name)
+        last_key = self.redshift.get_source_table_last_key(source_dim_name, surrogate_key)
+        self.logger.debug(f'{len(source_dim.index)} of {len(keys)} keys of {source_dim_name} were found in the warehouse.')
+
+        return source_dim, dim_columns, last_key
+
+
     # Returns dimension and bridge tables with new values (if any) and df with foreign (group) keys to the bridge
     def get_fact_dim_br(self, df: pd.DataFrame, dim_table_name: str, br_table_name: str,
                         natural_key: str, surrogate_key: str, group_key: str) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
 
-        source_dim = self.redshift.get_source_table(dim_table_name)
-        source_br = self.redshift.get_source_table(br_table_name)
+        source_dim, dim_columns = self.get_source_table(dim_table_name)
+        source_br, _ = self.get_source_table(br_table_name)
 
         # Dimension table based on the df data
-        current_dim = self.create_new_dim(df, source_dim, natural_key, surrogate_key, change_lists_into_rows=True)
+        current_dim = self.create_new_dim(df, source_dim, natural_key, surrogate_key, change_lists_into_rows=True, columns=dim_columns)
 
         # Adds natural keys to bridge table (in order to join with df)
         br_nat_keys = pd.merge(source_br, source_dim[[surrogate_key, natural_key]], on=surrogate_key, how='left')
@@ -108,7 +217,7 @@ class DataWarehouseTool():
         nat_keys_group_keys = self.create_new_dim(df, br_nat_keys_joined, natural_key, group_key)
 
         # Fact with appended group keys and dimension with new values
-        fact = pd.merge(df, nat_keys_group_keys[[natural_key, group_key]], on=natural_key,how='left')
+        fact = self.merge_keys(df, nat_keys_group_keys[[natural_key, group_key]], natural_key)
         dim = self.get_table_with_new_values(current_dim, source_dim, surrogate_key)
         # Bridge with new values
         nat_keys_group_keys_separate = self.lists_into_rows(nat_keys_group_keys, natural_key)
@@ -119,21 +228,32 @@ class DataWarehouseTool():
         return fact, dim, br
 
 
+    # Adds keys to df by its natural key. Categorical natural key keeps its dtype, so the merge compares
+    # category codes (keys are created from values of df, so no value is missing from the categories).
+    def merge_keys(self, df: pd.DataFrame, keys: pd.DataFrame, natural_key: str) -> pd.DataFrame:
+        if isinstance(df[natural_key].dtype, pd.CategoricalDtype):
+            keys = keys.astype({natural_key: df[natural_key].dtype})
+        return pd.merge(df, keys, on=natural_key, how='left')
+
+
     # Creates dimension table based on unique values from df 
-    # with assigned surrogate keys (from source dimension table and new ones - if any)
-    def create_new_dim(self, df: pd.DataFrame, source_dim: pd.DataFrame, natural_key: str, surrogate_key: str, change_lists_into_rows: bool=False) -> pd.DataFrame:
-        columns = [x for x in source_dim.columns if x in df.columns]
+    # with assigned surrogate keys (from source dimension table and new ones - if any).
+    # Columns of the dimension are those of the source table unless given.
+    def create_new_dim(self, df: pd.DataFrame, source_dim: pd.DataFrame, natural_key: str, surrogate_key: str, change_lists_into_rows: bool=False,
+                    columns: list=None, last_key: int=None) -> pd.DataFrame:
+        columns = [x for x in (columns or source_dim.columns) if x in df.columns]
         new_dim = df[columns].copy()
         if change_lists_into_rows:
             new_dim = self.lists_into_rows(new_dim, natural_key)
         new_dim = new_dim.drop_duplicates(natural_key)
         new_dim = new_dim.reset_index(drop=True)
-        new_dim = self.assign_surrogate_keys(new_dim, source_dim, natural_key, surrogate_key)
+        new_dim = self.assign_surrogate_keys(new_dim, source_dim, natural_key, surrogate_key, last_key)
         
         return new_dim
 
 
-    def assign_surrogate_keys(self, new_dim: pd.DataFrame, source_dim: pd.DataFrame, natural_key: str, surrogate_key: str) -> pd.DataFrame:
+    # Last key is taken from the source table unless given (if the source table has only some of the keys)
+    def assign_surrogate_keys(self, new_dim: pd.DataFrame, source_dim: pd.DataFrame, natural_key: str, surrogate_key: str, last_key: int=None) -> pd.DataFrame:
         if natural_key == 'published_date':
             source_dim['published_date'] = pd.to_datetime(source_dim['published_date'])
 
@@ -142,11 +262,12 @@ class DataWarehouseTool():
         source_dim.sort_values(by=[surrogate_key], inplace=True, ascending=False)
         
         # Finds last surrogate key from the source table
-        keys = source_dim[surrogate_key].head(1).values
-        if keys.size > 0:
-            last_key = keys[0]
-        else:   # If source table is empty
-            last_key = 0
+        if last_key is None:
+            keys = source_dim[surrogate_key].head(1).values
+            if keys.size > 0:
+                last_key = keys[0]
+            else:   # If source table is empty
+                last_key = 0
         
         # Assigns surrogate keys to rows without it
         s = (merged[surrogate_key].isna().cumsum() + last_key)
@@ -187,8 +308,12 @@ class DataWarehouseTool():
     
     def set_fact_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         # Adds column with new fact keys (based on the last key from source fact table)
-        fact_columns = self.redshift.get_source_table_columns(self.fact_table_name)
-        last_fact_key = self.redshift.get_source_table_last_key(self.fact_table_name, self.fact_table_key)
+        if self.key_cache is not None:
+            fact_columns = self.key_cache.get_columns(self.fact_table_name)
+            last_fact_key = self.key_cache.get_last_key(self.fact_table_name)
+        else:
+            fact_columns = self.redshift.get_source_table_columns(self.fact_table_name)
+            last_fact_key = self.redshift.get_source_table_last_key(self.fact_table_name, self.fact_table_key)
         df[fact_columns[0]] = df.index + 1 + last_fact_key
         
         # Changes column order to removes unncecessary ones to match the source fact table
@@ -0,0 +1,190 @@
+from ..common.redshift import RedshiftConnector
+from ..common.s3 import S3BucketConnector
+from datetime import datetime, timedelta
+import pandas as pd
+import json
+import logging
+
+
+# Keys of the dimension and bridge tables (natural and surrogate keys, group and surrogate keys) kept as parquet files
+# in S3 together with the columns and the last key of every table, so the tables are not read from Redshift.
+# New rows are saved as delta parts of the tables before every commit. The manifest is marked as pending until
+# the commit succeeds, so a run interrupted in between makes the next run reload the keys from Redshift.
+# Every check_interval_days days the keys are reloaded and compared with the cached ones.
+class DimensionKeyCache():
+    def __init__(self, redshift: RedshiftConnector, bucket: S3BucketConnector, cache_path: str, check_interval_days: float=7) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.redshift = redshift
+        self.bucket = bucket
+        self.cache_path = cache_path
+        self.manifest_key = f'{cache_path}manifest.parquet'
+        self.check_interval = timedelta(days=check_interval_days)
+        self.loaded = False
+
+        self.key_columns = {}
+        self.surrogate_keys = {}
+        self.tables = {}
+        self.columns = {}
+        self.last_keys = {}
+        self.new_rows = {}
+        self.changed = False
+        self.checked_at = None
+        self.pending = False
+        self.run_id = datetime.today().strftime('%Y%m%d_%H%M%S')
+        self.saved_parts = 0
+
+
+    # Only the last key and columns are kept of tables without key columns (e.g. the fact table)
+    def register(self, table_name: str, key_columns: list, surrogate_key: str) -> None:
+        self.key_columns[table_name] = key_columns
+        self.surrogate_keys[table_name] = surrogate_key
+
+
+    def load(self) -> None:
+        manifest = self.read_manifest()
+        if manifest is None:
+            reason = 'there is no cache yet'
+        elif (manifest['status'] != 'committed').any():
+            reason = 'the previous run was interrupted before its commit'
+        elif {row.table_name: json.loads(row.key_columns) for row in manifest.itertuples()} != self.key_columns:
+            reason = 'cached tables have changed'
+        elif datetime.now() - datetime.strptime(manifest['checked_at'].iloc[0], '%Y-%m-%d %H:%M:%S') >= self.check_interval:
+            reason = 'consistency check'
+        else:
+            self.read_cache(manifest)
+            self.loaded = True
+            self.logger.info(f'Dimension keys were loaded from the cache ({sum(len(table.index) for table in self.tables.values())} rows).')
+            return
+
+        self.logger.info(f'Dimension keys are reloaded from Redshift ({reason}).')
+        cached_tables = None
+        if reason == 'consistency check':
+            self.read_cache(manifest)
+            cached_tables = self.tables
+        self.reload(cached_tables)
+        self.loaded = True
+
+
+    def read_manifest(self) -> pd.DataFrame:
+        try:
+            return self.bucket.read_s3_to_df(self.manifest_key)
+        except self.bucket.session.client('s3').exceptions.NoSuchKey:
+            return None
+
+
+    def read_cache(self, manifest: pd.DataFrame) -> None:
+        self.tables = {}
+        for row in manifest.itertuples():
+            self.columns[row.table_name] = json.loads(row.columns)
+            self.last_keys[row.table_name] = int(row.last_key)
+            if self.key_columns[row.table_name]:
+                keys = [file.key for file in self.bucket.get_prefix_files(f'{self.cache_path}{row.table_name}/')]
+                parts = self.bucket.read_s3_files_to_dfs(keys)
+                parts = [self.normalize(part) for part in parts if not part.empty]
+                self.tables[row.table_name] = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=self.key_columns[row.table_name])
+        self.checked_at = manifest['checked_at'].iloc[0]
+
+
+    # Reads the keys from Redshift, compares them with cached_tables (if any) and replaces the cache
+    def reload(self, cached_tables: dict=None) -> None:
+        tables = {}
+        for table_name, key_columns in self.key_columns.items():
+            self.columns[table_name] = self.redshift.get_source_table_columns(table_name)
+            surrogate_key = self.surrogate_keys[table_name]
+            if key_columns:
+                tables[table_name] = self.normalize(self.redshift.get_source_table(table_name, key_columns))
+                keys = tables[table_name][surrogate_key]
+                self.last_keys[table_name] = int(keys.max()) if not keys.empty else 0
+            else:
+                self.last_keys[table_name] = int(self.redshift.get_source_table_last_key(table_name, surrogate_key))
+
+            if cached_tables is not None and table_name in cached_tables:
+                differences = self.count_differences(cached_tables[table_name], tables[table_name])
+                if differences:
+                    self.logger.warning(f'Cached keys of {table_name} differed from Redshift in {differences} rows, the cache was rebuilt.')
+
+        # Parts are replaced under the pending manifest, so an interrupted reload is repeated by the next run
+        self.write_manifest('pending')
+        old_keys = [file.key for file in self.bucket.get_prefix_files(self.cache_path) if file.key != self.manifest_key]
+        if old_keys:
+            self.bucket.delete_objects(old_keys)
+        for table_name, table in tables.items():
+            self.bucket.write_df_to_s3(table, self.get_part_key(table_name))
+        self.tables = tables
+        self.checked_at = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        self.write_manifest('committed')
+
+
+    def count_differences(self, cached_table: pd.DataFrame, table: pd.DataFrame) -> int:
+        merged = pd.merge(cached_table.astype(str), table.astype(str), how='outer', indicator=True)
+        return int((merged['_merge'] != 'both').sum())
+
+
+    # Types of the keys differ between Redshift (e.g. dates) and transformed data (e.g. datetimes, categories)
+    def normalize(self, table: pd.DataFrame) -> pd.DataFrame:
+        for column in table.columns:
+            if isinstance(table[column].dtype, pd.CategoricalDtype):
+                table[column] = table[column].astype(object)
+            if pd.api.types.infer_dtype(table[column], skipna=True) in ('date', 'datetime', 'datetime64'):
+                table[column] = pd.to_datetime(table[column])
+        return table
+
+
+    def get_table(self, table_name: str) -> pd.DataFrame:
+        # The caller can change the table in place (e.g. sort it)
+        return self.tables[table_name].copy()
+
+
+    def get_columns(self, table_name: str) -> list:
+        return self.columns[table_name]
+
+
+    def get_last_key(self, table_name: str) -> int:
+        return self.last_keys[table_name]
+
+
+    # Called for rows written to Redshift, they are saved by save_pending
+    def add(self, table_name: str, df: pd.DataFrame) -> None:
+        surrogate_key = self.surrogate_keys[table_name]
+        self.changed = True
+        if not df.empty:
+            self.last_keys[table_name] = max(self.last_keys[table_name], int(df[surrogate_key].max()))
+        key_columns = self.key_columns[table_name]
+        if key_columns:
+            rows = self.normalize(df[key_columns].copy())
+            self.tables[table_name] = pd.concat([self.tables[table_name], rows], ignore_index=True)
+            self.new_rows.setdefault(table_name, []).append(rows)
+
+
+    # Saves new rows before the commit, the cache is pending until mark_committed
+    def save_pending(self) -> None:
+        if not self.changed:
+            return
+        self.write_manifest('pending')
+        self.pending = True
+        for table_name, rows in self.new_rows.items():
+            self.bucket.write_df_to_s3(pd.concat(rows, ignore_index=True), self.get_part_key(table_name))
+        self.new_rows = {}
+        self.changed = False
+
+
+    def mark_committed(self) -> None:
+        if self.pending:
+            self.write_manifest('committed')
+            self.pending = False
+
+
+    def get_part_key(self, table_name: str) -> str:
+        self.saved_parts += 1
+        return f'{self.cache_path}{table_name}/{table_name}_{self.run_id}_{self.saved_parts:04d}.parquet'
+
+
+    def write_manifest(self, status: str) -> None:
+        manifest = pd.DataFrame({
+            'table_name': list(self.key_columns),
+            'key_columns': [json.dumps(self.key_columns[table_name]) for table_name in self.key_columns],
+            'columns': [json.dumps(self.columns[table_name]) for table_name in self.key_columns],
+            'last_key': [self.last_keys[table_name] for table_name in self.key_columns],
+            'checked_at': self.checked_at,
+            'status': status})
+        self.bucket.write_df_to_s3(manifest, self.manifest_key)
@@ -1,31 +1,226 @@
 import pandas as pd
 import numpy as np
 from ..common.s3 import S3BucketConnector
+from .categorical import CategoricalColumns
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
 import logging
 from ..common.custom_exceptions import WrongDataFileException
 
 
 class Transformer():
+    # Version of the transformed data, has to be changed with every change of the transform output.
+    # Staged data of other versions is evicted.
+    version = 1
+
     def __init__(self, bucket: S3BucketConnector, files_to_transform: list, 
                 s3_transformer_different_column_names: dict, 
-                transformer_dwh_different_column_names: dict) -> None:
+                transformer_dwh_different_column_names: dict,
+                streaming: bool=False, row_groups_per_chunk: int=0,
+                read_columns: list=None, read_threads: int=8, categorical_columns: list=None,
+                transform_processes: int=0, shard_by: str='published_date', staging_path: str='') -> None:
         self.logger = logging.getLogger(__name__)
         self.bucket = bucket
         self.files_to_transform = files_to_transform
         self.source_columns_names = s3_transformer_different_column_names
         self.target_columns_names = transformer_dwh_different_column_names
+        # In streaming mode files are transformed one chunk at a time: a whole file or row_groups_per_chunk
+        # row groups of a parquet file (0 - whole file), so memory does not depend on the number of files
+        self.streaming = streaming
+        self.row_groups_per_chunk = row_groups_per_chunk
+        # Only read_columns (source names) are downloaded from the data files (None or empty - all columns),
+        # files are read by read_threads threads
+        self.read_columns = read_columns or None
+        self.read_threads = read_threads
+        # Low-cardinality columns (transformer names) are converted to categorical dtype on load and kept that way
+        self.categorical_columns = categorical_columns or []
+        source_names = {transformer_name: source_name for source_name, transformer_name in self.source_columns_names.items()}
+        self.source_categorical_columns = [source_names.get(column, column) for column in self.categorical_columns]
+        self.target_categorical_columns = [self.target_columns_names.get(column, column) for column in self.categorical_columns]
+        # With more than one transform process the data is split into shards by published_date or by source file
+        # ('file') and the shards are transformed in a process pool
+        self.transform_processes = transform_processes
+        self.shard_by = shard_by
+        self.source_date_column = source_names.get('published_date', 'published_date')
+        # Transformed data of every file is staged under staging_path (empty - no staging)
+        self.staging_path = staging_path
+        self.staging_keys = {}
         
 
-    def get_transformed_data(self) -> pd.DataFrame:
+
+    # The bucket connector cannot be pickled and is not needed to transform shards in worker processes
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['bucket'] = None
+        return state
+
+
+    # Logs that there is nothing to transform (same for the batch and streaming paths)
+    def has_files_to_transform(self) -> bool:
         if len(self.files_to_transform) < 1:
-             self.logger.info(f'All data files in S3 bucket have already been transformed. If you wish to run the script on specific files, please remove their names from the metafile.')
-             return
+            self.logger.info('All data files in S3 bucket have already been transformed. If you wish to run the script on specific files, '
+                            'please remove their names from the metafile.')
+            return False
+        return True
+
+
+    def get_transformed_data(self) -> pd.DataFrame:
+        if not self.has_files_to_transform():
+            return
 
-        df = self.get_data()
-        df = self.transform_data(df)
+        if self.staging_path:
+            df = self.get_staged_data()
+        elif self.transform_processes > 1:
+            df = self.transform_in_processes(self.get_frames())
+        else:
+            df = self.get_data()
+            df = self.transform_data(df)
 
         return df
 
+
+    # Transformed data of every file is staged in S3 under a key derived from the content (ETag) of the file,
+    # the transform settings and the version, so files transformed by a previous run (e.g. one whose load
+    # to the warehouse failed) are read from the staging path instead of being transformed again.
+    # Files are transformed separately (in a process pool if there are transform processes),
+    # which gives the same result as the transform of the concatenated data.
+    def get_staged_data(self) -> pd.DataFrame:
+        staged_keys = self.evict_staged_data()
+        etags = self.bucket.get_etags(self.files_to_transform, self.read_threads)
+        staging_keys = dict(zip(self.files_to_transform, [self.get_staging_key(etag) for etag in etags]))
+        self.staging_keys = staging_keys
+        new_files = [file for file in self.files_to_transform if staging_keys[file] not in staged_keys]
+        self.logger.info(f'{len(self.files_to_transform) - len(new_files)} of {len(self.files_to_transform)} files '
+                        'have already been transformed, their data is read from the staging path.')
+
+        transformed = {}
+        if new_files:
+            frames = self.get_frames(new_files)
+            if self.transform_processes > 1 and len(frames) > 1:
+                with ProcessPoolExecutor(max_workers=min(self.transform_processes, len(frames))) as executor:
+                    transformed = dict(zip(new_files, executor.map(self.transform_data, frames)))
+            else:
+                transformed = {file: self.transform_data(frame) for file, frame in zip(new_files, frames)}
+            for file, df in transformed.items():
+                self.bucket.write_df_to_s3(df, staging_keys[file])
+
+        staged_files = [file for file in self.files_to_transform if file not in transformed]
+        staged_frames = self.bucket.read_s3_files_to_dfs([staging_keys[file] for file in staged_files], max_workers=self.read_threads)
+        # Empty frames lose the categorical dtype in parquet
+        transformed.update(zip(staged_files, [CategoricalColumns.convert(frame, self.target_categorical_columns) for frame in staged_frames]))
+
+        df = CategoricalColumns.concat([transformed[file] for file in self.files_to_transform])
+        df = df.reset_index(drop=True)
+
+        return df
+
+
+    def get_staging_prefix(self) -> str:
+        return f'{self.staging_path}v{self.version}/'
+
+
+    # Settings which change the transformed data are part of the key
+    def get_staging_key(self, etag: str) -> str:
+        settings = json.dumps([etag, self.source_columns_names, self.target_columns_names,
+                            self.read_columns, self.categorical_columns], sort_keys=True)
+        return f'{self.get_staging_prefix()}{hashlib.sha256(settings.encode()).hexdigest()}.parquet'
+
+
+    # Deletes staged data of other versions and returns keys of the current version
+    def evict_staged_data(self) -> set:
+        keys = [file.key for file in self.bucket.get_prefix_files(self.staging_path)]
+        stale_keys = [key for key in keys if not key.startswith(self.get_staging_prefix())]
+        if stale_keys:
+            self.bucket.delete_objects(stale_keys)
+            self.logger.info(f'{len(stale_keys)} staged files of other transformer versions were deleted.')
+
+        return set(keys) - set(stale_keys)
+
+
+    # Called after the files were loaded and committed, so the staging path keeps only files whose load failed
+    def delete_staged_data(self) -> None:
+        if not self.staging_keys:
+            return
+        self.bucket.delete_objects(sorted(set(self.staging_keys.values())))
+        self.logger.info(f'Staged data of {len(self.staging_keys)} loaded files was deleted.')
+        self.staging_keys = {}
+
+
+    # Every step of transform_data is row-independent (apart from the final reset of the index), so the shards
+    # are transformed separately and recombined in the order of their rows in the input. The result is
+    # the same as of transform_data run on the concatenated data.
+    def transform_in_processes(self, frames: list) -> pd.DataFrame:
+        if self.shard_by == 'file':
+            shards = [frame for frame in frames if not frame.empty]
+        else:
+            df = CategoricalColumns.concat(frames)
+            df['shard_row'] = np.arange(len(df.index))
+            shards = [shard for _, shard in df.groupby(self.source_date_column, sort=True, dropna=False)]
+        if len(shards) < 2:
+            df = CategoricalColumns.concat(frames)
+            CategoricalColumns.log_memory(df, self.logger, 'load')
+            return self.transform_data(df)
+
+        processes = min(self.transform_processes, len(shards))
+        self.logger.info(f'Transforming {len(shards)} shards (by {self.shard_by}) in {processes} processes.')
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(self.transform_data, shards))
+
+        df = CategoricalColumns.concat(results)
+        if 'shard_row' in df.columns:
+            df = df.sort_values('shard_row', kind='stable').drop(columns='shard_row')
+        df = df.reset_index(drop=True)
+
+        return df
+
+
+    # Yields (df, completed_files) pairs, where completed_files are the files whose last chunk is in df.
+    # df is None if the completed file has no rows.
+    def get_transformed_chunks(self):
+        if not self.has_files_to_transform():
+            return
+
+        columns = None
+        for file in self.files_to_transform:
+            previous_chunk = None
+            # Files are downloaded one by one here, so memory is bounded by a single chunk
+            # Chunks are transformed one behind, so that the last chunk of the file is known
+            for chunk in self.get_file_chunks(file):
+                if columns is None:
+                    columns = chunk.columns
+                self.check_columns(chunk.columns, columns)
+                chunk = CategoricalColumns.convert(chunk, self.source_categorical_columns)
+                if previous_chunk is not None:
+                    yield self.transform_data(previous_chunk), []
+                previous_chunk = chunk
+            if previous_chunk is not None:
+                yield self.transform_data(previous_chunk), [file]
+            else:
+                yield None, [file]
+
+
+    def get_file_chunks(self, file: str):
+        if not file.endswith('.parquet') or self.row_groups_per_chunk < 1:
+            yield self.bucket.read_s3_to_df(file, columns=self.read_columns)
+            return
+
+        # Row groups are downloaded with ranged GETs when they are read
+        parquet_file = self.bucket.open_s3_parquet(file)
+        for first_row_group in range(0, parquet_file.num_row_groups, self.row_groups_per_chunk):
+            row_groups = range(first_row_group, min(first_row_group + self.row_groups_per_chunk, parquet_file.num_row_groups))
+            yield parquet_file.read_row_groups(row_groups, columns=self.read_columns, use_pandas_metadata=True).to_pandas()
+
+
+    def check_columns(self, file_columns: pd.Index, columns: pd.Index) -> None:
+        if len(file_columns) != len(columns):
+            self.logger.error('Files cannot be transformed because their data has different number of columns.')
+            raise WrongDataFileException
+        elif len(columns.intersection(file_columns)) != len(columns):
+            self.logger.error('Files cannot be transformed because their data has different column names.')
+            raise WrongDataFileException
+
+
     def transform_data(self, df: pd.DataFrame) -> pd.DataFrame:
         
         # Source column names can be changed to fit the column names used by the transformer
@@ -36,6 +231,7 @@ class Transformer():
         # Remove leading and trailing whitespaces from data fame
         df_obj = df.select_dtypes(['object'])
         df[df_obj.columns] = df_obj.apply(lambda x: x.str.strip())
+        df = CategoricalColumns.strip(df)
         # Offers which do not include full-time employment are removed. None work_schedule is considered to be full-time
         df = df[df['work_schedule'].isnull() | df['work_schedule'].str.contains('pełny etat')].copy()
         # Remove offers with no category_id
@@ -47,6 +243,9 @@ class Transformer():
         df = self.transform_salary(df)
         df = self.transform_contract(df)
         df = df.reset_index(drop=True)
+        # Location and contract_type are rebuilt as strings by the transforms
+        df = CategoricalColumns.convert(df, self.categorical_columns)
+        CategoricalColumns.log_memory(df, self.logger, 'transform')
 
         # Column names used by the transformer can be renamed to fit the target database
         df.rename(columns=self.target_columns_names, inplace=True)
@@ -55,20 +254,29 @@ class Transformer():
 
 
     def get_data(self) -> pd.DataFrame:
-        frames = [self.bucket.read_s3_to_df(file) for file in self.files_to_transform]
-       
-        if not all(len(frame.columns) == len(frames[0].columns) for frame in frames):
-            self.logger.error('Files cannot be transformed because their data has different number of columns.')
-            raise WrongDataFileException
-        elif not all([len(frames[0].columns.intersection(df.columns)) == frames[0].shape[1] for df in frames]):
-            self.logger.error('Files cannot be transformed because their data has different column names.')
-            raise WrongDataFileException
-        
-        df = pd.concat(frames)
+        df = CategoricalColumns.concat(self.get_frames())
+        CategoricalColumns.log_memory(df, self.logger, 'load')
 
         return df
 
 
+    # Dataframes of the files (by default all files to transform)
+    def get_frames(self, files: list=None) -> list:
+        files = self.files_to_transform if files is None else files
+        # Schemas are checked (from parquet footers) before any data is downloaded
+        schemas = [pd.Index(columns) for columns in self.bucket.read_s3_columns(files, self.read_threads)]
+        for schema in schemas:
+            self.check_columns(schema, schemas[0])
+        if self.read_columns is not None and len(schemas[0].intersection(self.read_columns)) != len(self.read_columns):
+            self.logger.error(f'Files cannot be transformed because their data does not have all of the columns: {self.read_columns}.')
+            raise WrongDataFileException
+
+        frames = self.bucket.read_s3_files_to_dfs(files, self.read_columns, self.read_threads)
+        frames = [CategoricalColumns.convert(frame, self.source_categorical_columns) for frame in frames]
+
+        return frames
+
+
     def transform_date(self, df: pd.DataFrame) -> pd.DataFrame:
         df['published_date'] = pd.to_datetime(df['published_date'])
         date_column_index = df.columns.get_loc('published_date') + 1
@@ -86,8 +294,8 @@ class Transformer():
         df = df[~no_employer_info].copy()
         df = df.reset_index(drop=True)
         # clean address and nip
-        df['employer_address'] = df['employer_address'].apply(lambda x: x.replace('\n', ', '))
-        df['employer_tax_id'] = df['employer_tax_id'].apply(lambda x: x[5:])
+        df['employer_address'] = df['employer_address'].str.replace('\n', ', ', regex=False)
+        df['employer_tax_id'] = df['employer_tax_id'].str[5:]
         wrong_tax_id = df['employer_tax_id'].str.len() > 10
         df = df[~wrong_tax_id].copy()
         df = df.reset_index(drop=True)
@@ -96,56 +304,62 @@ class Transformer():
 
 
     def transform_location(self, df: pd.DataFrame, max_locations: int=5) -> pd.DataFrame:
+        # Masks of work modes are computed once and filtered together with the rows
+        only_remote = (df['work_mode'] == 'praca zdalna').to_numpy()
+        only_mobile = (df['work_mode'] == 'praca mobilna').to_numpy()
+        remote = df['work_mode'].str.contains('praca zdalna')
+        mobile = df['work_mode'].str.contains('praca mobilna')
         # If work_mode is only remote/mobile, then location is also only remote/mobile
-        df['location'] = np.where(df['work_mode'] == 'praca zdalna', 'praca zdalna', df['location'])
-        df['location'] = np.where(df['work_mode'] == 'praca mobilna', 'praca mobilna', df['location'])
-        # Keep only city, without street address
-        df['location'] = df['location'].str.split(', ')
-        df['location'] = df['location'].apply(lambda x:x[-1])
-        df['location'] = df['location'].astype(str).str.split('|')
+        location = np.where(only_remote, 'praca zdalna', df['location'])
+        location = pd.Series(np.where(only_mobile, 'praca mobilna', location), index=df.index)
+        # Keep only city, without street address (text after the last ', ')
+        location = location.str.replace(r'(?s)^.*, ', '', regex=True).astype(str)
+        # Locations are separated with '|'
+        too_many_locations = (location.str.count(r'\|') + 1) > max_locations
         # If there are more than maximum number of locations
         # if work_mode does not include remote/mobile work, then the row is removed
-        condition_delete = (df['location'].str.len() > max_locations) & ~(df['work_mode'].str.contains('praca mobilna') | df['work_mode'].str.contains('praca zdalna'))
-        df = df[~condition_delete].copy()
+        condition_delete = too_many_locations & ~(mobile | remote)
+        keep = ~condition_delete.to_numpy()
+        df = df[keep].copy()
+        location, too_many_locations, remote, mobile = location[keep], too_many_locations[keep], remote[keep], mobile[keep]
+        only_remote, only_mobile = only_remote[keep], only_mobile[keep]
+        location = location.str.replace('|', ', ', regex=False)
         # if work_mode includes remote/mobile work, then location is equal to remote/mobile work
-        condition_remote = (df['location'].str.len() > max_locations) & (df['work_mode'].str.contains('praca zdalna'))
-        df['location'] = np.where(condition_remote, 'praca zdalna', df['location'])
-        condition_mobile = (df['location'].str.len() > max_locations) & (df['work_mode'].str.contains('praca mobilna'))
-        df['location'] = np.where(condition_mobile, 'praca mobilna', df['location'])
-        df['location'] = df['location'].str.join(', ')
+        # (joined with ', ' character by character, as the previous list-based implementation did)
+        condition_remote = too_many_locations & remote
+        location = np.where(condition_remote, ', '.join('praca zdalna'), location)
+        condition_mobile = too_many_locations & mobile
+        location = np.where(condition_mobile, ', '.join('praca mobilna'), location)
         # If there are 5 or less locations
         # if work_mode contains remote/mobile work and other modes, then remote/mobile work is treated as additional location
-        condition_add_remote = ((df['work_mode'] != 'praca zdalna') & (df['work_mode'] != 'praca mobilna')) & (df['work_mode'].str.contains('praca zdalna'))
-        df['location'] = np.where(condition_add_remote, df['location'] + ', praca zdalna', df['location'])
-        condition_add_mobile = ((df['work_mode'] != 'praca zdalna') & (df['work_mode'] != 'praca mobilna')) & (df['work_mode'].str.contains('praca mobilna'))
-        df['location'] = np.where(condition_add_mobile, df['location'] + ', praca mobilna', df['location'])
-        
+        other_modes = ~only_remote & ~only_mobile
+        condition_add_remote = other_modes & remote
+        location = np.where(condition_add_remote, location + ', praca zdalna', location)
+        condition_add_mobile = other_modes & mobile
+        df['location'] = np.where(condition_add_mobile, location + ', praca mobilna', location)
+
         return df
 
 
     def transform_salary(self, df: pd.DataFrame) -> pd.DataFrame:
         # Remove currency unit form max_salary
-        df['max_salary'] = df['max_salary'].map(lambda x: x.rstrip(' zł'))
+        max_salary = df['max_salary'].str.rstrip(' zł')
         # If there is no min_salary then it is equal to max_salary
-        df['min_salary'] = np.where(df['min_salary'].isnull(), df['max_salary'], df['min_salary'])
+        min_salary = df['min_salary'].fillna(max_salary)
         # Remove '-' from min_salary
-        df['min_salary'] = df['min_salary'].map(lambda x: x.rstrip('–'))
-        # Remove '\xa0' unicode from salaries
-        df['min_salary'] = df['min_salary'].apply(lambda x: x.replace('\xa0', ''))
-        df['max_salary'] = df['max_salary'].apply(lambda x: x.replace('\xa0', ''))
-        # Convert salaries to numeric type
-        df['min_salary'] = df['min_salary'].apply(lambda x: x.replace(',', '.'))
-        df['max_salary'] = df['max_salary'].apply(lambda x: x.replace(',', '.'))
-        df['min_salary'] = pd.to_numeric(df['min_salary'])
-        df['max_salary'] = pd.to_numeric(df['max_salary'])
+        min_salary = min_salary.str.rstrip('–')
+        # Remove '\xa0' unicode from salaries and convert them to numeric type
+        for column, salary in [('min_salary', min_salary), ('max_salary', max_salary)]:
+            df[column] = pd.to_numeric(salary.str.replace('\xa0', '', regex=False).str.replace(',', '.', regex=False))
         # In case someone used monthly salary for hourly (and other way around) the row is removed
-        wrong_monthly = (df['min_salary'] < 1000) & (df['salary_type'].str.contains('mies.'))
-        df = df[~wrong_monthly].copy()
-        wrong_hourly = (df['min_salary'] >= 1000) & (df['salary_type'].str.contains('godz.'))
-        df = df[~wrong_hourly].copy()
+        monthly = df['salary_type'].str.contains('mies.')
+        hourly = df['salary_type'].str.contains('godz.')
+        wrong_salary_type = ((df['min_salary'] < 1000) & monthly) | ((df['min_salary'] >= 1000) & hourly)
+        df = df[~wrong_salary_type].copy()
+        hourly = hourly[~wrong_salary_type]
         # Convert hourly salary to monthly
-        df['min_salary'] = np.where(df['salary_type'].str.contains('godz.'), df['min_salary']*8*20, df['min_salary'])
-        df['max_salary'] = np.where(df['salary_type'].str.contains('godz.'), df['max_salary']*8*20, df['max_salary'])
+        df['min_salary'] = np.where(hourly, df['min_salary']*8*20, df['min_salary'])
+        df['max_salary'] = np.where(hourly, df['max_salary']*8*20, df['max_salary'])
 
         return df
 
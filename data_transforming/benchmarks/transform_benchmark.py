@@ -0,0 +1,122 @@
+# Compares the per-row (map/apply) implementation of Transformer.transform_employer, transform_location
+# and transform_salary with the vectorized one on a synthetic frame and checks that their outputs are identical.
+# Run from the data_transforming directory: python -m benchmarks.transform_benchmark --rows 1000000
+from app.transforming.transform import Transformer
+from io import BytesIO
+import pandas as pd
+import numpy as np
+import argparse
+import time
+
+
+def generate_data(rows: int, seed: int=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    def pick(values: list, probabilities: list=None) -> np.ndarray:
+        return np.array(values, dtype=object)[rng.choice(len(values), rows, p=probabilities)]
+
+    locations = ['ul. Prosta 1, Warszawa', 'Kraków', 'Gdańsk', 'Wrocław|Poznań', 'Warszawa|Kraków|Gdańsk|Łódź|Lublin|Katowice',
+                'Aleje Jerozolimskie 1, 00-001 Warszawa', 'Łódź|Lublin', 'a, b, Katowice']
+    work_modes = ['praca stacjonarna', 'praca zdalna', 'praca mobilna', 'praca hybrydowa, praca zdalna',
+                'praca stacjonarna, praca mobilna', 'praca zdalna, praca mobilna', None]
+    max_salaries = ['12\xa0000 zł', '8\xa0500,50 zł', '45 zł', '120,5 zł', '950 zł', '25\xa0000 zł']
+    min_salaries = ['8\xa0000–', '6\xa0000,25–', '30–', '90,5–', None]
+    salary_types = ['brutto / mies.', 'netto (+ VAT) / mies.', 'brutto / godz.', 'netto (+ VAT) / godz.']
+    employer_names = ['Firma sp. z o.o.', 'Spółka S.A.', None]
+    employer_addresses = ['ul. Prosta 1\n00-001 Warszawa', 'Rynek 2\n31-001 Kraków', None]
+    employer_tax_ids = ['NIP: 1234567890', 'NIP: 9876543210', 'NIP: 12345678901', None]
+
+    return pd.DataFrame({
+        'location': pick(locations), 'work_mode': pick(work_modes, [0.3, 0.2, 0.1, 0.15, 0.1, 0.1, 0.05]),
+        'min_salary': pick(min_salaries), 'max_salary': pick(max_salaries), 'salary_type': pick(salary_types),
+        'employer_name': pick(employer_names, [0.45, 0.45, 0.1]), 'employer_address': pick(employer_addresses, [0.45, 0.45, 0.1]),
+        'employer_tax_id': pick(employer_tax_ids, [0.4, 0.4, 0.1, 0.1])})
+
+
+# Implementation before vectorization, kept as the reference output
+def transform_employer_before(df: pd.DataFrame) -> pd.DataFrame:
+    no_employer_info = df['employer_name'].isnull() | df['employer_address'].isnull() | df['employer_tax_id'].isnull()
+    df = df[~no_employer_info].copy()
+    df = df.reset_index(drop=True)
+    df['employer_address'] = df['employer_address'].apply(lambda x: x.replace('\n', ', '))
+    df['employer_tax_id'] = df['employer_tax_id'].apply(lambda x: x[5:])
+    wrong_tax_id = df['employer_tax_id'].str.len() > 10
+    df = df[~wrong_tax_id].copy()
+    df = df.reset_index(drop=True)
+    return df
+
+
+def transform_location_before(df: pd.DataFrame, max_locations: int=5) -> pd.DataFrame:
+    df['location'] = np.where(df['work_mode'] == 'praca zdalna', 'praca zdalna', df['location'])
+    df['location'] = np.where(df['work_mode'] == 'praca mobilna', 'praca mobilna', df['location'])
+    df['location'] = df['location'].str.split(', ')
+    df['location'] = df['location'].apply(lambda x:x[-1])
+    df['location'] = df['location'].astype(str).str.split('|')
+    condition_delete = (df['location'].str.len() > max_locations) & ~(df['work_mode'].str.contains('praca mobilna') | df['work_mode'].str.contains('praca zdalna'))
+    df = df[~condition_delete].copy()
+    condition_remote = (df['location'].str.len() > max_locations) & (df['work_mode'].str.contains('praca zdalna'))
+    df['location'] = np.where(condition_remote, 'praca zdalna', df['location'])
+    condition_mobile = (df['location'].str.len() > max_locations) & (df['work_mode'].str.contains('praca mobilna'))
+    df['location'] = np.where(condition_mobile, 'praca mobilna', df['location'])
+    df['location'] = df['location'].str.join(', ')
+    condition_add_remote = ((df['work_mode'] != 'praca zdalna') & (df['work_mode'] != 'praca mobilna')) & (df['work_mode'].str.contains('praca zdalna'))
+    df['location'] = np.where(condition_add_remote, df['location'] + ', praca zdalna', df['location'])
+    condition_add_mobile = ((df['work_mode'] != 'praca zdalna') & (df['work_mode'] != 'praca mobilna')) & (df['work_mode'].str.contains('praca mobilna'))
+    df['location'] = np.where(condition_add_mobile, df['location'] + ', praca mobilna', df['location'])
+    return df
+
+
+def transform_salary_before(df: pd.DataFrame) -> pd.DataFrame:
+    df['max_salary'] = df['max_salary'].map(lambda x: x.rstrip(' zł'))
+    df['min_salary'] = np.where(df['min_salary'].isnull(), df['max_salary'], df['min_salary'])
+    df['min_salary'] = df['min_salary'].map(lambda x: x.rstrip('–'))
+    df['min_salary'] = df['min_salary'].apply(lambda x: x.replace('\xa0', ''))
+    df['max_salary'] = df['max_salary'].apply(lambda x: x.replace('\xa0', ''))
+    df['min_salary'] = df['min_salary'].apply(lambda x: x.replace(',', '.'))
+    df['max_salary'] = df['max_salary'].apply(lambda x: x.replace(',', '.'))
+    df['min_salary'] = pd.to_numeric(df['min_salary'])
+    df['max_salary'] = pd.to_numeric(df['max_salary'])
+    wrong_monthly = (df['min_salary'] < 1000) & (df['salary_type'].str.contains('mies.'))
+    df = df[~wrong_monthly].copy()
+    wrong_hourly = (df['min_salary'] >= 1000) & (df['salary_type'].str.contains('godz.'))
+    df = df[~wrong_hourly].copy()
+    df['min_salary'] = np.where(df['salary_type'].str.contains('godz.'), df['min_salary']*8*20, df['min_salary'])
+    df['max_salary'] = np.where(df['salary_type'].str.contains('godz.'), df['max_salary']*8*20, df['max_salary'])
+    return df
+
+
+def to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    out_buffer = BytesIO()
+    df.to_parquet(out_buffer, index=False)
+    return out_buffer.getvalue()
+
+
+def run(rows: int) -> None:
+    data = generate_data(rows)
+    transformer = Transformer.__new__(Transformer)
+    cases = {
+        'employer': (transform_employer_before, transformer.transform_employer),
+        'location': (transform_location_before, transformer.transform_location),
+        'salary': (transform_salary_before, transformer.transform_salary),
+    }
+
+    print(f'{rows} rows')
+    print(f'{"transform":<12}{"before [s]":>12}{"after [s]":>12}{"speedup":>10}')
+    for name, (before, after) in cases.items():
+        # Work mode of rows without it is not used by the salary and employer transforms, location needs it
+        before_input, after_input = data.copy(), data.copy()
+        start = time.perf_counter()
+        before_result = before(before_input)
+        before_time = time.perf_counter() - start
+        start = time.perf_counter()
+        after_result = after(after_input)
+        after_time = time.perf_counter() - start
+
+        assert to_parquet_bytes(before_result) == to_parquet_bytes(after_result), f'Output of transform_{name} differs.'
+        print(f'{name:<12}{before_time:>12.2f}{after_time:>12.2f}{before_time/after_time:>9.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the vectorized Transformer methods.')
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+    run(args.rows)
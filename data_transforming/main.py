@@ -3,14 +3,19 @@ from app.common.redshift import RedshiftConnector
 from app.common.custom_exceptions import CustomException
 from app.transforming.transform import Transformer
 from app.transforming.dwh_tool import DataWarehouseTool
+from app.transforming.key_cache import DimensionKeyCache
 from app.common.meta_process import MetaProcess
+import argparse
 import yaml
 import logging
 import logging.config
 
 
 def run():
-    
+    parser = argparse.ArgumentParser(description='Transform new data files and load them to the data warehouse.')
+    parser.add_argument('--reconcile', action='store_true', help='Find files to transform by comparing all files with the metafile')
+    args = parser.parse_args()
+
     config_path = './configs/data-transforming-config.yml'
     config = yaml.safe_load(open(config_path))
 
@@ -26,19 +31,31 @@ def run():
         transformer_config = config['transformer']
         dwh_tool_config = config['data_warehouse']
         meta_config = config['meta']
+        key_cache_config = config.get('key_cache', {})
+        if args.reconcile:
+            meta_config['discovery'] = 'full'
 
         bucket_connector = S3BucketConnector(**s3_config)
         redshift_connector = RedshiftConnector(**redshift_config)
+        key_cache = None
+        if key_cache_config.get('cache_path'):
+            key_cache = DimensionKeyCache(redshift_connector, bucket_connector, **key_cache_config)
 
         files = MetaProcess.get_files_to_transform(bucket_connector, logger, **meta_config)
         transformer = Transformer(bucket=bucket_connector, files_to_transform=files, **transformer_config)
         dwh_tool = DataWarehouseTool(redshift=redshift_connector, bucket=bucket_connector, 
                                     transformed_files=files, metafile_key=meta_config['metafile_key'],
+                                    watermark_key=meta_config.get('watermark_key', ''), key_cache=key_cache,
                                     **dwh_tool_config)
         
 
-        df = transformer.get_transformed_data()
-        dwh_tool.generate_facts_and_dims(df)
+        if transformer.streaming:
+            dwh_tool.generate_facts_and_dims_streaming(transformer.get_transformed_chunks())
+        else:
+            df = transformer.get_transformed_data()
+            dwh_tool.generate_facts_and_dims(df)
+            if df is not None and not df.empty:
+                transformer.delete_staged_data()
 
 
     except CustomException:
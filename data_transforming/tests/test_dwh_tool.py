@@ -0,0 +1,28 @@
+from app.transforming.dwh_tool import DataWarehouseTool
+from app.transforming.key_cache import DimensionKeyCache
+from app.common.custom_exceptions import WrongConfigException
+import unittest
+
+
+class DataWarehouseToolConfigTest(unittest.TestCase):
+    def create_tool(self, **kwargs) -> DataWarehouseTool:
+        return DataWarehouseTool(redshift=None, bucket=None, transformed_files=[], metafile_key='metafile.csv',
+                                fact_table_name='fact_salary', fact_table_key='salary_key',
+                                one_to_many_template=['dim_table', 'natural_key', 'surrogate_key'],
+                                many_to_many_template=['dim_table', 'br_table', 'natural_key', 'surrogate_key', 'group_key'],
+                                one_to_many_dims=[['dim_offer', 'offer_id', 'offer_key']], many_to_many_dims=[], **kwargs)
+
+
+    def test_push_down_key_lookup_with_key_cache_is_rejected(self) -> None:
+        key_cache = DimensionKeyCache(None, None, 'dimension_keys/')
+        with self.assertRaises(WrongConfigException):
+            self.create_tool(key_cache=key_cache, push_down_key_lookup=True)
+
+
+    def test_push_down_key_lookup_or_key_cache(self) -> None:
+        self.assertTrue(self.create_tool(push_down_key_lookup=True).push_down_key_lookup)
+        self.assertFalse(self.create_tool(key_cache=DimensionKeyCache(None, None, 'dimension_keys/')).push_down_key_lookup)
+
+
+if __name__ == '__main__':
+    unittest.main()
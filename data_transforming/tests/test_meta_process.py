@@ -0,0 +1,71 @@
+from app.common.meta_process import MetaProcess
+import pandas as pd
+import boto3
+import logging
+import unittest
+
+
+# Keeps the dataframes in memory instead of S3
+class MemoryBucket():
+    def __init__(self, keys: list) -> None:
+        self.session = boto3.Session(region_name='us-east-1')
+        self.keys = keys
+        self.dfs = {}
+
+
+    def read_s3_to_df(self, key: str) -> pd.DataFrame:
+        if key not in self.dfs:
+            raise self.session.client('s3').exceptions.NoSuchKey({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return self.dfs[key].copy()
+
+
+    def write_df_to_s3(self, df: pd.DataFrame, key: str) -> None:
+        self.dfs[key] = df.copy()
+
+
+    def get_prefix_files(self, prefix: str) -> list:
+        return [type('Object', (), {'key': key}) for key in self.keys if key.startswith(prefix)]
+
+
+    def get_prefix_keys_after(self, prefix: str, start_after: str) -> list:
+        return [key for key in self.keys if key.startswith(prefix) and key > start_after]
+
+
+class MetaProcessTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.bucket = MemoryBucket(['data/a.csv', 'data/b.csv', 'data/c.csv'])
+
+
+    def get_files(self, discovery: str='watermark') -> list:
+        return MetaProcess.get_files_to_transform(self.bucket, self.logger, 'metafile.csv', 'data/', discovery, 'watermark.csv')
+
+
+    def commit(self, files: list, pending_files: list) -> None:
+        MetaProcess.update_meta_file(self.bucket, self.logger, 'metafile.csv', files, 'watermark.csv', pending_files)
+
+
+    def test_full_discovery_is_sorted(self) -> None:
+        self.bucket.keys.reverse()
+        self.assertEqual(self.get_files('full'), ['data/a.csv', 'data/b.csv', 'data/c.csv'])
+
+
+    def test_watermark_stops_before_pending_file(self) -> None:
+        self.commit(['data/a.csv'], ['data/b.csv', 'data/c.csv'])
+        self.commit(['data/c.csv'], ['data/b.csv'])
+        self.assertEqual(MetaProcess.get_watermark(self.bucket, 'watermark.csv'), ('data/a.csv', {'data/c.csv'}))
+        self.assertEqual(self.get_files(), ['data/b.csv'])
+
+        self.commit(['data/b.csv'], [])
+        self.assertEqual(MetaProcess.get_watermark(self.bucket, 'watermark.csv'), ('data/c.csv', set()))
+        self.assertEqual(self.get_files(), [])
+
+
+    def test_no_watermark_before_first_file_is_committed(self) -> None:
+        self.commit(['data/b.csv'], ['data/a.csv'])
+        self.assertEqual(MetaProcess.get_watermark(self.bucket, 'watermark.csv'), (None, set()))
+        self.assertEqual(self.get_files(), ['data/a.csv', 'data/c.csv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
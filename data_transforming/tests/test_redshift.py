@@ -0,0 +1,58 @@
+from app.common.redshift import RedshiftConnector
+import pandas as pd
+import unittest
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+# DuckDB database stands in for Redshift, the lookup uses only standard SQL and DB-API calls
+@unittest.skipUnless(duckdb, 'duckdb is not installed')
+class LookupKeysTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.connection = duckdb.connect()
+        self.connection.execute('CREATE TABLE dim_offer (offer_key INTEGER, offer_id VARCHAR)')
+        self.connection.execute("INSERT INTO dim_offer VALUES (1, '1001'), (2, '1002'), (3, '1003'), (4, NULL)")
+        self.redshift = RedshiftConnector.from_connection(self.connection, '?')
+
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+
+    # Returns sorted (surrogate key, natural key) pairs, missing natural keys as None
+    def lookup(self, keys: list, **kwargs) -> list:
+        pairs = self.redshift.lookup_keys('dim_offer', 'offer_id', 'offer_key', keys, **kwargs)
+        self.assertEqual(list(pairs.columns), ['offer_key', 'offer_id'])
+        return sorted((int(key), None if pd.isna(offer_id) else offer_id) for key, offer_id in pairs.itertuples(index=False, name=None))
+
+
+    def test_matched_keys(self) -> None:
+        self.assertEqual(self.lookup(['1003', '1001']), [(1, '1001'), (3, '1003')])
+
+
+    def test_new_keys_are_not_returned(self) -> None:
+        self.assertEqual(self.lookup(['1002', '2001', '2002']), [(2, '1002')])
+        self.assertEqual(self.lookup(['2001']), [])
+
+
+    def test_keys_are_sent_in_batches(self) -> None:
+        self.assertEqual(self.lookup(['1001', '1002', '2001', '1003'], batch_size=3), [(1, '1001'), (2, '1002'), (3, '1003')])
+
+
+    def test_null_keys(self) -> None:
+        self.assertEqual(self.lookup(['1001', None]), [(1, '1001')])
+        self.assertEqual(self.lookup(['1001', None], include_nulls=True), [(1, '1001'), (4, None)])
+        self.assertEqual(self.lookup([], include_nulls=True), [(4, None)])
+
+
+    def test_staging_table_is_dropped(self) -> None:
+        self.lookup(['1001'])
+        tables = self.connection.execute("SELECT table_name FROM information_schema.tables WHERE table_name LIKE 'staging%'").fetchall()
+        self.assertEqual(tables, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
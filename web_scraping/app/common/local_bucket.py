@@ -0,0 +1,102 @@
+import boto3
+from .s3 import S3BucketConnector
+from io import BytesIO
+from threading import Lock
+import hashlib
+import os
+import logging
+
+
+# Objects of the bucket stored as files under the root directory
+class LocalBucket():
+    def __init__(self, root_dir: str, no_such_key: type) -> None:
+        self.root_dir = root_dir
+        self.no_such_key = no_such_key
+        self.objects = LocalObjectCollection(root_dir)
+
+
+    def put_object(self, Body, Key: str) -> None:
+        path = os.path.join(self.root_dir, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        with open(path, 'wb') as file:
+            file.write(Body)
+
+
+    def Object(self, key: str):
+        return LocalObject(os.path.join(self.root_dir, key), self.no_such_key)
+
+
+class LocalObject():
+    def __init__(self, path: str, no_such_key: type) -> None:
+        self.path = path
+        self.no_such_key = no_such_key
+
+
+    def get(self) -> dict:
+        if not os.path.isfile(self.path):
+            raise self.no_such_key({'Error': {'Code': 'NoSuchKey', 'Message': self.path}}, 'GetObject')
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        return {'Body': BytesIO(data), 'ETag': get_etag(data)}
+
+
+# ETag of an object which was not uploaded in parts is MD5 of its content
+def get_etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+# Lists objects of the bucket like bucket.objects of boto3
+class LocalObjectCollection():
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir = root_dir
+
+
+    def filter(self, Prefix: str='') -> list:
+        objects = []
+        for dir_path, _, file_names in os.walk(self.root_dir):
+            for file_name in file_names:
+                key = os.path.relpath(os.path.join(dir_path, file_name), self.root_dir).replace(os.sep, '/')
+                if key.startswith(Prefix):
+                    objects.append(LocalObjectSummary(key))
+        return sorted(objects, key=lambda summary: summary.key)
+
+
+class LocalObjectSummary():
+    def __init__(self, key: str) -> None:
+        self.key = key
+
+
+# Stand-in for S3BucketConnector which keeps objects in a local directory,
+# e.g. for replaying scraped pages offline or testing shard leases
+class LocalBucketConnector(S3BucketConnector):
+    # Conditional writes are atomic only between connectors of one process
+    _write_lock = Lock()
+
+    def __init__(self, root_dir: str, target_path: str) -> None:
+        # Session is used only to raise and catch the same NoSuchKey exception as S3
+        self.session = boto3.Session()
+        self.logger = logging.getLogger(__name__)
+        self._no_such_key = self.session.client('s3', region_name='us-east-1').exceptions.NoSuchKey
+        self._bucket = LocalBucket(root_dir, self._no_such_key)
+        self.target_path = target_path
+
+
+    def write_bytes_to_s3_if(self, data: bytes, key: str, etag: str=None) -> str:
+        with self._write_lock:
+            if self.read_s3_to_bytes_with_etag(key)[1] != etag:
+                return None
+            self._bucket.put_object(Body=data, Key=key)
+            return get_etag(data)
+
+
+    def delete_objects(self, keys: list) -> None:
+        for key in keys:
+            os.remove(os.path.join(self._bucket.root_dir, key))
+
+
+    def move_object(self, source_key: str, target_key: str) -> None:
+        target_path = os.path.join(self._bucket.root_dir, target_key)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(os.path.join(self._bucket.root_dir, source_key), target_path)
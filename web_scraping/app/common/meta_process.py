@@ -20,18 +20,24 @@ class MetaProcess():
                 logger.error('Columns in metafile do not match columns in new dataframe.')
                 raise WrongMetafileException
             df_all = pd.concat([df_old, df_new])
-        except bucket.session.client('s3').exceptions.NoSuchKey:
+        except bucket._no_such_key:
             df_all = df_new
         bucket.write_df_to_s3(df_all, meta_key)
 
 
     @staticmethod
-    def get_dates(start_date: date, end_date: date, bucket: S3BucketConnector, logger: Logger, meta_key: str) -> list:
+    def get_processed_dates(bucket: S3BucketConnector, meta_key: str) -> set:
         try:
             meta_df = bucket.read_s3_to_df(meta_key)
             meta_dates = set(pd.to_datetime(meta_df['source_date']).dt.date)
-        except bucket.session.client('s3').exceptions.NoSuchKey:
+        except bucket._no_such_key:
             meta_dates = set()
+        return meta_dates
+
+
+    @staticmethod
+    def get_dates(start_date: date, end_date: date, bucket: S3BucketConnector, logger: Logger, meta_key: str) -> list:
+        meta_dates = MetaProcess.get_processed_dates(bucket, meta_key)
         
         if end_date <= start_date:
             logger.error(f'End date ({end_date}) cannot be less than or equal to start date ({start_date}).')
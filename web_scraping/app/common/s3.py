@@ -1,4 +1,5 @@
 import boto3
+from botocore.exceptions import ClientError
 import pandas as pd
 from io import BytesIO, StringIO
 from datetime import date, datetime
@@ -16,6 +17,7 @@ class S3BucketConnector():
         self.logger = logging.getLogger(__name__)
         self._s3 = self.session.resource(service_name='s3', endpoint_url=endpoint_url)
         self._bucket = self._s3.Bucket(bucket_name)
+        self._no_such_key = self._s3.meta.client.exceptions.NoSuchKey
         self.target_path = target_path
 
 
@@ -35,6 +37,55 @@ class S3BucketConnector():
         self._bucket.put_object(Body=out_buffer.getvalue(), Key=key)
 
 
+    def write_bytes_to_s3(self, data: bytes, key: str) -> None:
+        self._bucket.put_object(Body=data, Key=key)
+
+
+    # Returns None if the object does not exist
+    def read_s3_to_bytes(self, key: str) -> bytes:
+        try:
+            return self._bucket.Object(key=key).get().get('Body').read()
+        except self._no_such_key:
+            return None
+
+
+    # Returns (data, ETag) of the object or (None, None) if it does not exist
+    def read_s3_to_bytes_with_etag(self, key: str) -> tuple:
+        try:
+            response = self._bucket.Object(key=key).get()
+        except self._no_such_key:
+            return None, None
+        return response.get('Body').read(), response.get('ETag')
+
+
+    # Conditional write: without etag the object is created only if it does not exist, with etag it is replaced
+    # only if it was not changed since. Returns ETag of the written object or None if the condition failed.
+    def write_bytes_to_s3_if(self, data: bytes, key: str, etag: str=None) -> str:
+        condition = {'IfNoneMatch': '*'} if etag is None else {'IfMatch': etag}
+        try:
+            return self._s3.meta.client.put_object(Bucket=self._bucket.name, Key=key, Body=data, **condition)['ETag']
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict', 'NoSuchKey'):
+                return None
+            raise
+
+
+    # S3 has no rename, the object is copied and the source is deleted
+    def move_object(self, source_key: str, target_key: str) -> None:
+        self._bucket.Object(target_key).copy_from(CopySource={'Bucket': self._bucket.name, 'Key': source_key})
+        self._bucket.Object(source_key).delete()
+
+
+    def delete_objects(self, keys: list) -> None:
+        # At most 1000 keys can be deleted by one request
+        for first_key in range(0, len(keys), 1000):
+            self._bucket.delete_objects(Delete={'Objects': [{'Key': key} for key in keys[first_key:first_key + 1000]]})
+
+
+    def get_prefix_files(self, prefix: str) -> list:
+        return self._bucket.objects.filter(Prefix=prefix)
+
+
     def read_s3_to_df(self, key: str, decoding='utf-8', sep=',') -> pd.DataFrame:
         format_position = key.rfind('.') + 1
         file_format = key[format_position:]
@@ -42,6 +93,10 @@ class S3BucketConnector():
             csv_file = self._bucket.Object(key=key).get().get('Body').read().decode(decoding)
             data = StringIO(csv_file)
             df = pd.read_csv(data, delimiter=sep)
+        elif file_format == 'parquet':
+            parquet_file = self._bucket.Object(key=key).get().get('Body').read()
+            data = BytesIO(parquet_file)
+            df = pd.read_parquet(data)
         else:
             self.logger.error(f"The file format '{file_format}' is not supported to be read from s3.")
             raise WrongFileFormat
@@ -49,10 +104,12 @@ class S3BucketConnector():
         return df
 
 
-    def generate_file_key(self, start_date: date, end_date: date, file_format: str) -> str:
+    def generate_file_key(self, start_date: date, end_date: date, file_format: str, shard_id: str='') -> str:
         today_date = datetime.today().strftime('%Y%m%d_%H%M%S')
         start_date = start_date.strftime('%Y%m%d')
         end_date = end_date.strftime('%Y%m%d')
+        if shard_id:    # Files of shards scraped at the same time by different pods cannot collide
+            today_date = f'{today_date}_{shard_id}'
         key = f'{self.target_path}pracuj_daily_data_{today_date}.{file_format}'
         return key
 
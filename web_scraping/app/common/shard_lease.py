@@ -0,0 +1,106 @@
+from .s3 import S3BucketConnector
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import socket
+import uuid
+import json
+import time
+import logging
+
+
+# Lets several scraper pods split scrape dates into disjoint shards. Each shard (and named lock)
+# is claimed by writing a lease object to S3 with its owner and expiry time. Leases are written
+# conditionally: a new lease only if none exists, an existing one only if its ETag did not change
+# since it was read, so of the pods claiming the same lease at once only one succeeds.
+# Expired leases (e.g. of a killed pod) can be taken over by other pods.
+# Any bucket with read_s3_to_bytes_with_etag and write_bytes_to_s3_if methods can be used, e.g. a local stand-in.
+class ShardLease():
+    def __init__(self, bucket: S3BucketConnector, lease_prefix: str, shard_days: int=1, ttl_minutes: int=60) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.bucket = bucket
+        self.lease_prefix = lease_prefix
+        self.shard_days = max(1, shard_days)
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.owner = f'{socket.gethostname()}-{uuid.uuid4().hex[:8]}'
+        # ETags of the leases written by this pod
+        self.etags = {}
+
+
+    # Splits dates (sorted from the newest) into shards of shard_days consecutive dates
+    def split(self, scrape_dates: list) -> list:
+        shards = []
+        for index in range(0, len(scrape_dates), self.shard_days):
+            dates = scrape_dates[index:index+self.shard_days]
+            shard_id = f'{min(dates).strftime("%Y%m%d")}_{max(dates).strftime("%Y%m%d")}'
+            shards.append((shard_id, dates))
+        return shards
+
+
+    # Yields (shard_id, dates) of shards claimed by this pod
+    def claim_shards(self, scrape_dates: list):
+        for shard_id, dates in self.split(scrape_dates):
+            if self.claim(shard_id):
+                self.logger.info(f"Shard '{shard_id}' was claimed by {self.owner}.")
+                yield shard_id, dates
+
+
+    def claim(self, name: str) -> bool:
+        lease, etag = self.read_lease(name)
+        if lease is not None and lease['owner'] != self.owner and not self.is_expired(lease):
+            return False
+        return self.write_lease(name, datetime.now(timezone.utc) + self.ttl, etag)
+
+
+    # Returns False if the lease was taken over by another pod (e.g. after it expired)
+    def renew(self, name: str) -> bool:
+        if self.write_lease(name, datetime.now(timezone.utc) + self.ttl, self.etags.get(name)):
+            return True
+        self.logger.warning(f"Lease '{name}' of {self.owner} was taken over by another pod.")
+        return False
+
+
+    # Lease is expired immediately, so the name can be claimed again
+    def release(self, name: str) -> None:
+        self.write_lease(name, datetime.now(timezone.utc), self.etags.pop(name, None))
+
+
+    # Holds a named lease for the with block, e.g. for read-modify-write of shared metafiles
+    @contextmanager
+    def lock(self, name: str, retry_seconds: float=5):
+        while not self.claim(name):
+            time.sleep(retry_seconds)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+
+    # Returns the lease and its ETag, (None, None) if the lease does not exist
+    def read_lease(self, name: str) -> tuple:
+        data, etag = self.bucket.read_s3_to_bytes_with_etag(self.get_lease_key(name))
+        if data is None:
+            return None, None
+        return json.loads(data), etag
+
+
+    # Without etag the lease is created only if it does not exist, with etag it is replaced only if it was
+    # not changed since it was read. Returns False if another pod wrote the lease first.
+    def write_lease(self, name: str, expires_at: datetime, etag: str=None) -> bool:
+        lease = {'owner': self.owner, 'expires_at': expires_at.isoformat()}
+        etag = self.bucket.write_bytes_to_s3_if(json.dumps(lease).encode('utf-8'), self.get_lease_key(name), etag)
+        if etag is None:
+            return False
+        self.etags[name] = etag
+        return True
+
+
+    def is_expired(self, lease: dict) -> bool:
+        expires_at = datetime.fromisoformat(lease['expires_at'])
+        # Leases written before the expiry time had a time zone are in UTC
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at <= datetime.now(timezone.utc)
+
+
+    def get_lease_key(self, name: str) -> str:
+        return f'{self.lease_prefix}{name}.json'
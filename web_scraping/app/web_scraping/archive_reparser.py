@@ -0,0 +1,92 @@
+from ..common.s3 import S3BucketConnector
+from .page_archive import PageArchive
+from .html_parser import HtmlParser
+from .offer_parser import OfferParser
+from .batch_writer import RecordBatchWriter
+from .metrics import ScraperMetrics
+from datetime import date, timedelta
+import logging
+
+
+# Rebuilds scraped data files of a date range from the page archive without loading any page,
+# e.g. after the HTML of the source webpage changed or a parsing bug was fixed
+class ArchiveReparser():
+    def __init__(self, target_bucket: S3BucketConnector, column_headers: list, archive_path: str,
+                target_file_format: str='parquet', rows_per_part: int=5000, parser: str='lxml') -> None:
+        self.logger = logging.getLogger(__name__)
+        self.target_bucket = target_bucket
+        self.column_headers = column_headers
+        self.target_file_format = target_file_format
+        self.rows_per_part = rows_per_part
+        self.page_archive = PageArchive(target_bucket, archive_path)
+        self.html_parser = HtmlParser(parser)
+        self.metrics = ScraperMetrics()
+        self.offer_parser = OfferParser(self.html_parser, self.metrics)
+
+
+    # Reparses offers published from start_date up to (excluding) end_date and returns keys of written files.
+    # Job pages are read twice: first only their employer profile links, so that only the employer pages
+    # needed by the date range are kept in memory.
+    def reparse(self, start_date: date, end_date: date) -> list:
+        employer_links = self.get_employer_links(start_date, end_date)
+        employer_pages = self.page_archive.read_employer_pages(employer_links)
+        employer_data = {}
+        self.logger.info(f'{len(employer_pages)} of {len(employer_links)} employer profiles linked from the offers were loaded from the archive.')
+
+        batch_writer = RecordBatchWriter(self.target_bucket, self.column_headers, start_date, end_date,
+                                        self.target_file_format, self.rows_per_part, metrics=self.metrics)
+        for job, html in self.get_job_pages(start_date, end_date):
+            batch_writer.write_rows(self.reparse_job(job, html, employer_pages, employer_data))
+
+        part_keys = batch_writer.close()
+        counters = self.metrics.summary()['counters']
+        self.logger.info(f"Reparsing finished. {counters.get('offers', 0)} offers were reparsed into {batch_writer.rows_written} records "
+                        f"in {len(part_keys)} file(s), {counters.get('offers_dropped', 0)} offers were dropped and "
+                        f"{counters.get('employers_missing', 0)} employer profiles were not found in the archive.")
+        return part_keys
+
+
+    # Yields (job, html) of offers published in the date range. Offer archived more than once
+    # (e.g. scraped again after removing its date from the metafile) is yielded from its latest page only
+    def get_job_pages(self, start_date: date, end_date: date):
+        for day in range((end_date - start_date).days):
+            publish_date = start_date + timedelta(days=day)
+            reparsed_links = set()
+            for key in reversed(self.page_archive.get_job_segment_keys(publish_date)):
+                for job, html in self.page_archive.read_job_pages_of_segment(key, publish_date):
+                    if job['link'] in reparsed_links:
+                        continue
+                    reparsed_links.add(job['link'])
+                    yield job, html
+
+
+    def get_employer_links(self, start_date: date, end_date: date) -> set:
+        employer_links = set()
+        for _, html in self.get_job_pages(start_date, end_date):
+            employer_link = self.offer_parser.get_employer_profile_link(self.html_parser.parse(html, 'employer_link'), html)
+            if employer_link is not None:
+                employer_links.add(employer_link)
+        return employer_links
+
+
+    # Employer profiles are parsed once and reused between offers
+    def reparse_job(self, job: dict, html: str, employer_pages: dict, employer_data: dict) -> list:
+        try:
+            with self.metrics.timer('html_parse'):
+                job_html = self.html_parser.parse(html, 'job')
+
+            employer_profile_link = self.offer_parser.get_employer_profile_link(job_html, html)
+            if employer_profile_link is not None and employer_profile_link not in employer_data:
+                if employer_profile_link in employer_pages:
+                    employer_data[employer_profile_link] = self.offer_parser.parse_employer_profile(employer_pages[employer_profile_link])
+                else:   # e.g. the profile was taken from the employer cache filled before archiving was enabled
+                    self.metrics.count('employers_missing')
+                    employer_data[employer_profile_link] = [None]*3
+            data_per_contract = self.offer_parser.parse_job(job_html, job, employer_data.get(employer_profile_link, [None]*3))
+        except AttributeError:
+            self.logger.warning(f"Tag was not found in the archived page. Please check if the HTML of the source webpage was changed: {job['link']}")
+            self.metrics.count('offers_dropped')
+            return []
+
+        self.metrics.count('offers')
+        return data_per_contract
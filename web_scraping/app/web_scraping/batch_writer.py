@@ -0,0 +1,110 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.csv as pv
+from ..common.s3 import S3BucketConnector
+from ..common.custom_exceptions import WrongFileFormat
+from .metrics import ScraperMetrics
+from io import BytesIO
+from datetime import date
+import logging
+
+
+# Collects scraped rows in typed column buffers and writes them to S3 as part files
+# of rows_per_part rows, so only one part is kept in memory at a time.
+# If staging_path is set, parts are written under it and moved to the target path by publish,
+# so parts of a shard interrupted before its dates and offers were saved are not loaded by the transformer.
+class RecordBatchWriter():
+    column_types = {'published_date': pa.date32()}
+
+    def __init__(self, bucket: S3BucketConnector, column_headers: list, start_date: date, end_date: date,
+                file_format: str='parquet', rows_per_part: int=5000, shard_id: str='', metrics: ScraperMetrics=None,
+                staging_path: str='') -> None:
+        self.logger = logging.getLogger(__name__)
+        self.bucket = bucket
+        self.schema = pa.schema([(column, self.column_types.get(column, pa.string())) for column in column_headers])
+        self.file_format = file_format
+        self.rows_per_part = rows_per_part
+        self.metrics = metrics or ScraperMetrics()
+        self.base_key = bucket.generate_file_key(start_date, end_date, file_format, shard_id)
+        self.staging_path = staging_path
+        self.part_keys = []
+        self.rows_written = 0
+        self._buffers = {column: [] for column in column_headers}
+        self._buffered_rows = 0
+
+
+    def write_rows(self, rows: list) -> None:
+        for row in rows:
+            for column, value in zip(self.schema.names, row):
+                self._buffers[column].append(self.convert_value(column, value))
+            self._buffered_rows += 1
+            if self._buffered_rows >= self.rows_per_part:
+                self.flush()
+
+
+    # Values of string columns are stored as text, e.g. offer_id
+    def convert_value(self, column: str, value):
+        if value is None or self.schema.field(column).type != pa.string():
+            return value
+        return str(value)
+
+
+    def flush(self) -> None:
+        if self._buffered_rows < 1:
+            return
+
+        table = pa.Table.from_pydict(self._buffers, schema=self.schema)
+        out_buffer = BytesIO()
+        if self.file_format == 'parquet':
+            pq.write_table(table, out_buffer)
+        elif self.file_format == 'csv':
+            pv.write_csv(table, out_buffer)
+        else:
+            self.logger.error(f"The file format '{self.file_format}' is not supported to be written to s3.")
+            raise WrongFileFormat
+
+        key = self.get_part_key(len(self.part_keys))
+        with self.metrics.timer('s3_write'):
+            self.bucket.write_bytes_to_s3(out_buffer.getvalue(), self.get_staging_key(key))
+        self.part_keys.append(key)
+        self.rows_written += self._buffered_rows
+        self.logger.debug(f"Part file '{key}' was written with {self._buffered_rows} records.")
+
+        self._buffers = {column: [] for column in self.schema.names}
+        self._buffered_rows = 0
+
+
+    def get_part_key(self, part_number: int) -> str:
+        format_position = self.base_key.rfind('.')
+        return f'{self.base_key[:format_position]}_part{part_number:04d}{self.base_key[format_position:]}'
+
+
+    def get_staging_key(self, key: str) -> str:
+        if not self.staging_path:
+            return key
+        return f"{self.staging_path}{key[key.rfind('/') + 1:]}"
+
+
+    # Writes remaining rows and returns keys of all written part files
+    def close(self) -> list:
+        self.flush()
+        return self.part_keys
+
+
+    # Deletes the staged part files, returns False if the parts were written to the target path (no staging path)
+    def discard(self) -> bool:
+        if not self.staging_path:
+            return False
+        self.bucket.delete_objects([self.get_staging_key(key) for key in self.part_keys])
+        self.logger.debug(f'{len(self.part_keys)} staged part files were deleted.')
+        return True
+
+
+    # Moves the staged part files to the target path
+    def publish(self) -> list:
+        if self.staging_path:
+            with self.metrics.timer('s3_write'):
+                for key in self.part_keys:
+                    self.bucket.move_object(self.get_staging_key(key), key)
+            self.logger.debug(f'{len(self.part_keys)} part files were moved from the staging path.')
+        return self.part_keys
@@ -0,0 +1,63 @@
+from selenium.webdriver.chrome.options import Options
+import logging
+
+
+# Chrome settings of the scraper. The lean profile does not download resources which are not needed
+# to render the parsed tags: resource types are blocked by URL patterns through CDP and hosts outside
+# allowed_domains are not resolved. With the 'eager' strategy pages are returned after DOMContentLoaded
+# and the scraper waits explicitly only for the tags it parses.
+class BrowserProfile():
+    blocked_extensions = {
+        'image': ['png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'ico'],
+        'font': ['woff', 'woff2', 'ttf', 'otf', 'eot'],
+        'stylesheet': ['css'],
+        'media': ['mp4', 'webm', 'mp3'],
+    }
+
+    def __init__(self, lean: bool=False, page_load_strategy: str='normal', blocked_resource_types: list=None,
+                blocked_url_patterns: list=None, allowed_domains: list=None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.lean = lean
+        self.page_load_strategy = page_load_strategy if lean else 'normal'
+        self.blocked_urls = []
+        self.allowed_domains = []
+        if lean:
+            for resource_type in blocked_resource_types or []:
+                self.blocked_urls += [f'*.{extension}*' for extension in self.blocked_extensions[resource_type]]
+            self.blocked_urls += blocked_url_patterns or []
+            self.allowed_domains = allowed_domains or []
+        self.name = 'lean' if lean else 'default'
+
+
+    def get_chrome_options(self) -> Options:
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        prefs = {"profile.managed_default_content_settings.images": 2}
+        chrome_options.add_experimental_option("prefs", prefs)
+        chrome_options.page_load_strategy = self.page_load_strategy
+        if self.allowed_domains:
+            # Third-party hosts (analytics, ads, etc.) fail to resolve
+            excluded = ', '.join(f'EXCLUDE {domain}, EXCLUDE *.{domain}' for domain in self.allowed_domains)
+            chrome_options.add_argument(f'--host-resolver-rules=MAP * ~NOTFOUND, {excluded}')
+        if self.lean:
+            chrome_options.add_argument("--disable-extensions")
+            chrome_options.add_argument("--disable-background-networking")
+        return chrome_options
+
+
+    # Called for every new Chrome driver, URL blocking is set per browser session
+    def apply(self, driver) -> None:
+        if self.blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+
+
+    # Bytes transferred for the current page and its resources. Resource timing reports sizes of
+    # cross-origin resources only if they allow it, so the count is a lower bound.
+    def get_transferred_bytes(self, driver) -> int:
+        return driver.execute_script(
+            "return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))"
+            ".reduce((total, entry) => total + (entry.transferSize || 0), 0);")
+
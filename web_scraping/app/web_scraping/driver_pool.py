@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import Counter
+from threading import Lock
+from queue import Queue
+from .metrics import ScraperMetrics
+import os
+import logging
+
+
+# Keeps a fixed number of drivers created by create_driver and spreads work across them (one thread per driver).
+# Drivers are restarted after max_pages pages or when memory of the browser processes passes max_memory_mb,
+# which is checked every memory_check_pages pages. Drivers are restarted only between pages, so no page is dropped.
+# A driver which could not be created again is replaced with None and created when its slot is borrowed next time.
+class DriverPool():
+    def __init__(self, size: int, create_driver, max_pages: int=0, max_memory_mb: float=0,
+                memory_check_pages: int=10, metrics: ScraperMetrics=None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.size = max(1, size)
+        self.create_driver = create_driver
+        self.max_pages = max_pages
+        self.max_memory = max_memory_mb * 1024 * 1024
+        self.memory_check_pages = max(1, memory_check_pages)
+        self.metrics = metrics or ScraperMetrics()
+        self.drivers = [self.create_driver() for _ in range(self.size)]
+        self.restarts = Counter()
+        self.peak_memory = 0
+        self._page_counts = {id(driver): 0 for driver in self.drivers}
+        self._lock = Lock()
+        self._idle_drivers = Queue()
+        for driver in self.drivers:
+            self._idle_drivers.put(driver)
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+        self.logger.info(f'Driver pool started with {self.size} driver(s).')
+
+
+    # Borrows an idle driver for the duration of the with block, every borrowing counts as one page
+    @contextmanager
+    def acquire(self):
+        driver = self._idle_drivers.get()
+        if driver is None:
+            try:
+                driver = self.recreate_driver()
+            except Exception:
+                self._idle_drivers.put(None)
+                raise
+        try:
+            yield driver
+        finally:
+            self._idle_drivers.put(self.check_driver(driver))
+
+
+    # Returns the driver or a new one if the driver had to be restarted
+    def check_driver(self, driver):
+        with self._lock:
+            self._page_counts[id(driver)] += 1
+            pages = self._page_counts[id(driver)]
+
+        reason = None
+        if self.max_pages and pages >= self.max_pages:
+            reason = 'pages'
+        elif self.max_memory and pages % self.memory_check_pages == 0:
+            memory = self.get_driver_memory(driver)
+            if memory is not None:
+                self.logger.debug(f'Driver memory: {memory/1024/1024:.0f} MB after {pages} pages.')
+                with self._lock:
+                    self.peak_memory = max(self.peak_memory, memory)
+                if memory > self.max_memory:
+                    reason = 'memory'
+
+        if reason is None:
+            return driver
+        return self.restart_driver(driver, reason, pages)
+
+
+    def restart_driver(self, driver, reason: str, pages: int):
+        try:
+            driver.quit()
+        except Exception:
+            self.logger.warning('Driver could not be quit before the restart.', exc_info=True)
+        try:
+            new_driver = self.create_driver()
+        except Exception:
+            self.logger.exception(f'Driver could not be restarted after {pages} pages (limit: {reason}), it will be created when it is needed.')
+            new_driver = None
+
+        with self._lock:
+            self.drivers[self.drivers.index(driver)] = new_driver
+            del self._page_counts[id(driver)]
+            if new_driver is not None:
+                self._page_counts[id(new_driver)] = 0
+                self.restarts[reason] += 1
+        if new_driver is None:
+            self.metrics.count('driver_restart_failures')
+            return None
+        self.metrics.count(f'driver_restarts_{reason}')
+        self.logger.info(f'Driver was restarted after {pages} pages (limit: {reason}).')
+        return new_driver
+
+
+    # Creates the driver of a slot whose restart failed, the exception is raised again if it fails
+    def recreate_driver(self):
+        new_driver = self.create_driver()
+        with self._lock:
+            self.drivers[self.drivers.index(None)] = new_driver
+            self._page_counts[id(new_driver)] = 0
+        self.logger.info('Driver which could not be restarted was created.')
+        return new_driver
+
+
+    # Resident memory of the driver service and all browser processes started by it,
+    # None if the driver has no local process (e.g. replay driver) or /proc is not available
+    def get_driver_memory(self, driver) -> int:
+        try:
+            root_pid = driver.service.process.pid
+            children = {}
+            for pid in filter(str.isdigit, os.listdir('/proc')):
+                with open(f'/proc/{pid}/stat') as stat_file:
+                    # Process name can contain spaces, fields after it are separated by the closing bracket
+                    parent_pid = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(parent_pid, []).append(int(pid))
+        except (AttributeError, OSError):
+            return None
+
+        memory = 0
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        pids = [root_pid]
+        while pids:
+            pid = pids.pop()
+            pids += children.get(pid, [])
+            try:
+                with open(f'/proc/{pid}/statm') as statm_file:
+                    memory += int(statm_file.read().split()[1]) * page_size
+            except OSError:     # process has exited
+                pass
+        return memory
+
+
+    def log_state(self) -> None:
+        self.logger.info(f"Drivers were restarted {sum(self.restarts.values())} times ({self.restarts['pages']} after the page limit, "
+                        f"{self.restarts['memory']} after the memory limit), peak memory of a driver was {self.peak_memory/1024/1024:.0f} MB.")
+
+
+    # Runs func(driver, item) for every item on the pool's drivers and returns results in the order of items
+    def map(self, func, items: list) -> list:
+        def run(item):
+            with self.acquire() as driver:
+                return func(driver, item)
+
+        return list(self._executor.map(run, items))
+
+
+    def quit(self) -> None:
+        self._executor.shutdown(wait=True)
+        for driver in self.drivers:
+            if driver is not None:
+                driver.quit()
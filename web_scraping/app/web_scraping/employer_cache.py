@@ -0,0 +1,78 @@
+from ..common.s3 import S3BucketConnector
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+import pandas as pd
+import logging
+
+
+# Parsed employer data ([name, address, tax_id]) keyed by employer profile link.
+# Entries expire after ttl_days, the least recently used ones are evicted above max_size.
+# The cache is stored in S3 between runs.
+class EmployerCache():
+    columns = ['profile_link', 'employer_name', 'employer_address', 'employer_tax_id', 'cached_at']
+
+    def __init__(self, bucket: S3BucketConnector, cache_key: str, ttl_days: int=30, max_size: int=5000) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.bucket = bucket
+        self.cache_key = cache_key
+        self.ttl = timedelta(days=ttl_days)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+
+    def load(self) -> None:
+        try:
+            df = self.bucket.read_s3_to_df(self.cache_key)
+        except self.bucket._no_such_key:
+            self.logger.info('Employer cache was not found. Starting with an empty cache.')
+            return
+
+        df = df.astype(object).where(pd.notnull(df), None)
+        now = datetime.today()
+        for row in df.itertuples(index=False):
+            cached_at = pd.to_datetime(row.cached_at).to_pydatetime()
+            if now - cached_at < self.ttl:
+                self._entries[row.profile_link] = ([row.employer_name, row.employer_address, row.employer_tax_id], cached_at)
+        self.evict()
+        self.logger.info(f'Employer cache loaded with {len(self._entries)} entries.')
+
+
+    def save(self) -> None:
+        with self._lock:
+            rows = [[link] + data + [cached_at] for link, (data, cached_at) in self._entries.items()]
+        df = pd.DataFrame(rows, columns=self.columns)
+        self.bucket.write_df_to_s3(df, self.cache_key)
+        self.logger.info(f'Employer cache saved with {len(rows)} entries (hits: {self.hits}, misses: {self.misses}).')
+
+
+    # Returns copy of cached employer data or None if there is no valid entry
+    def get(self, profile_link: str) -> list:
+        with self._lock:
+            entry = self._entries.get(profile_link)
+            if entry is not None and datetime.today() - entry[1] >= self.ttl:
+                del self._entries[profile_link]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(profile_link)
+            self.hits += 1
+            return list(entry[0])
+
+
+    def put(self, profile_link: str, employer_data: list) -> None:
+        with self._lock:
+            self._entries[profile_link] = (list(employer_data), datetime.today())
+            self._entries.move_to_end(profile_link)
+            self.evict()
+
+
+    def evict(self) -> None:
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
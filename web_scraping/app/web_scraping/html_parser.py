@@ -0,0 +1,60 @@
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+import soupsieve as sv
+import re
+
+
+# Strainers compare class names with the whole class attribute of a tag (e.g. 'pagination_element pagination_element--next'),
+# so tags are matched if any of their classes is one of class_names
+def any_class(class_names: list):
+    class_names = set(class_names)
+    return lambda classes: classes is not None and not class_names.isdisjoint(classes.split() if isinstance(classes, str) else classes)
+
+
+# Parses only the parts of listing, job and employer pages which are read by the scraper.
+# Strainers and CSS selectors are compiled once and shared by all threads.
+class HtmlParser():
+    strainers = {
+        'listing': SoupStrainer(class_=any_class(['results', 'pagination_element--next'])),
+        'job': SoupStrainer(class_=any_class([
+            'offer-viewkHIhn3', 'offer-viewumlDlF', 'offer-viewXo2dpV', 'offer-viewEmkiAc',
+            'employer-profile-WcUgc', 'employer-profileiHwZjJ', 'ep-profile-link',
+            'offer-viewLdvtPw', 'offer-viewSGW6Yi', 'offer-vieweHKpRl'])),
+        'employer': SoupStrainer(class_=any_class(['title-container', 'box-content'])),
+        # Only employer profile links of job pages, e.g. to find the employer profiles needed for reparsing
+        'employer_link': SoupStrainer('a', class_=any_class(['employer-profileiHwZjJ', 'ep-profile-link'])),
+    }
+    # Server-rendered tags which have to be present in the HTML for a page to be parsed without the browser.
+    # Employer profile block of job pages is rendered by JS, so its link is searched in the HTML (see employer_profile_link_pattern)
+    required_selectors = {
+        'listing': [sv.compile('div.results'), sv.compile('li.results__list-container-item')],
+        'job': [sv.compile('h1.offer-viewkHIhn3'), sv.compile('div.offer-viewXo2dpV')],
+    }
+    employer_profile_link_pattern = re.compile(r'href="(https://pracodawcy\.pracuj\.pl/company/[^"]+)"')
+    # Tags which the browser waits for before the page source is read (pages are parsed when they appear)
+    browser_wait_selectors = {
+        'listing': 'div.results',
+        'job': '.employer-profile-WcUgc',
+    }
+    # Offers are list items whose only class is results__list-container-item
+    job_offer_selector = sv.compile('li[class="results__list-container-item"]')
+
+    def __init__(self, parser: str='lxml') -> None:
+        self.parser = parser
+
+
+    def parse(self, html: str, page_type: str) -> BeautifulSoup:
+        return BeautifulSoup(html, self.parser, parse_only=self.strainers[page_type])
+
+
+    def has_required_tags(self, soup: BeautifulSoup, page_type: str) -> bool:
+        return all(selector.select_one(soup) is not None for selector in self.required_selectors[page_type])
+
+
+    # Returns the first link to an employer profile in the HTML or None
+    def find_employer_profile_link(self, html: str) -> str:
+        match = self.employer_profile_link_pattern.search(html)
+        return match.group(1) if match else None
+
+
+    def select_job_offers(self, search_result: Tag) -> list:
+        return self.job_offer_selector.select(search_result)
@@ -0,0 +1,108 @@
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Thread
+from urllib.parse import urlsplit
+import asyncio
+import logging
+
+
+# Raised for responses telling that the server is overloaded (429 and 5xx)
+class ServerBusyError(requests.HTTPError):
+    pass
+
+
+# Raised instead of sending a request whose deadline has already expired
+class DeadlineExpiredError(requests.RequestException):
+    pass
+
+
+# Fetches pages which do not need a browser. Requests run on a background asyncio loop
+# sharing one keep-alive connection pool, limited per host and bounded by timeouts.
+class HttpFetcher():
+    errors = (requests.RequestException, asyncio.TimeoutError)
+    # Errors which mean that requests should be sent slower (e.g. not 404 of a missing page)
+    congestion_errors = (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError, ServerBusyError)
+
+    def __init__(self, max_connections: int=10, max_connections_per_host: int=4,
+                timeout: float=10, encoding: str='utf-8', headers: dict=None, adapter: HTTPAdapter=None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.encoding = encoding
+
+        self.session = requests.Session()
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self._host_limits = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_connections)
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+
+    # Timeout of the request can be shortened (e.g. to the remaining time of its deadline)
+    async def fetch(self, url: str, timeout: float=None) -> str:
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        if timeout <= 0:
+            raise DeadlineExpiredError(f'Deadline expired before the request was sent: {url}')
+        host_limit = self.get_host_limit(url)
+        await host_limit.acquire()
+        try:
+            request = self._loop.run_in_executor(self._executor, self.request, url, timeout)
+        except BaseException:
+            host_limit.release()
+            raise
+        # The worker thread cannot be cancelled, so the slot of the host is released when the thread finishes
+        # (not when the caller stops waiting)
+        request.add_done_callback(lambda _: host_limit.release())
+        # Connect and read timeouts apply per socket operation, the whole request is bounded as well
+        return await asyncio.wait_for(asyncio.shield(request), timeout=timeout*2)
+
+
+    async def fetch_all(self, urls: list) -> list:
+        return await asyncio.gather(*[self.fetch(url) for url in urls], return_exceptions=True)
+
+
+    def request(self, url: str, timeout: float=None) -> str:
+        response = self.session.get(url, timeout=self.timeout if timeout is None else timeout)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise ServerBusyError(f'{response.status_code} Server Error for url: {url}', response=response)
+        response.raise_for_status()
+        response.encoding = self.encoding
+        return response.text
+
+
+    # Semaphores are created lazily inside the loop so that they are bound to it
+    def get_host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return self._host_limits[host]
+
+
+    # Thread-safe entry points for the synchronous scraper code
+    def submit(self, url: str, timeout: float=None) -> Future:
+        return asyncio.run_coroutine_threadsafe(self.fetch(url, timeout), self._loop)
+
+
+    def get(self, url: str, timeout: float=None) -> str:
+        return self.submit(url, timeout).result()
+
+
+    # Returns page texts in the order of urls, failed requests are returned as exceptions
+    def get_all(self, urls: list) -> list:
+        return asyncio.run_coroutine_threadsafe(self.fetch_all(urls), self._loop).result()
+
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+from threading import Lock
+import numpy as np
+import time
+
+
+# Durations of scraper stages (e.g. job_load, html_parse) and event counters of one run.
+# Can be shared by threads of the driver pool.
+class ScraperMetrics():
+    quantiles = [0.5, 0.9, 0.99]
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self._durations = defaultdict(list)
+        self._counters = Counter()
+        self._lock = Lock()
+
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - start)
+
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._durations[stage].append(seconds)
+
+
+    def count(self, event: str, value: int=1) -> None:
+        with self._lock:
+            self._counters[event] += value
+
+
+    def summary(self) -> dict:
+        with self._lock:
+            durations = {stage: np.array(values) for stage, values in self._durations.items()}
+            counters = dict(self._counters)
+
+        elapsed = time.monotonic() - self.started
+        stages = {}
+        for stage, values in durations.items():
+            stages[stage] = {'count': len(values), 'total_seconds': float(values.sum()), 'max_seconds': float(values.max())}
+            for quantile in self.quantiles:
+                stages[stage][f'p{int(quantile*100)}_seconds'] = float(np.quantile(values, quantile))
+
+        minutes = max(elapsed, 1e-9) / 60
+        return {'elapsed_seconds': elapsed, 'stages': stages, 'counters': counters,
+                'pages_per_minute': counters.get('pages', 0) / minutes,
+                'offers_per_minute': counters.get('offers', 0) / minutes,
+                'browser_bytes_per_page': counters.get('browser_bytes', 0) / max(counters.get('browser_pages', 0), 1)}
+
+
+    # Summary in the Prometheus text exposition format (e.g. for the node exporter textfile collector)
+    def to_prometheus(self, summary: dict) -> str:
+        lines = ['# HELP scraper_stage_duration_seconds Duration of scraper stages.',
+                '# TYPE scraper_stage_duration_seconds summary']
+        for stage, stats in summary['stages'].items():
+            for quantile in self.quantiles:
+                lines.append(f'scraper_stage_duration_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[f"p{int(quantile*100)}_seconds"]}')
+            lines.append(f'scraper_stage_duration_seconds_sum{{stage="{stage}"}} {stats["total_seconds"]}')
+            lines.append(f'scraper_stage_duration_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        lines += ['# HELP scraper_events_total Number of scraper events.', '# TYPE scraper_events_total counter']
+        for event, value in summary['counters'].items():
+            lines.append(f'scraper_events_total{{event="{event}"}} {value}')
+
+        for gauge in ['elapsed_seconds', 'pages_per_minute', 'offers_per_minute', 'browser_bytes_per_page']:
+            lines += [f'# TYPE scraper_{gauge} gauge', f'scraper_{gauge} {summary[gauge]}']
+        return '\n'.join(lines) + '\n'
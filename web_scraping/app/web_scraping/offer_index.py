@@ -0,0 +1,63 @@
+from ..common.s3 import S3BucketConnector
+from threading import Lock
+import pandas as pd
+import numpy as np
+import logging
+
+
+# Sorted array of ids of offers scraped in previous runs, stored in S3 next to the metafile.
+# Offers claimed in the current run are kept aside, so the same offer is not scraped twice
+# within a run and only successfully scraped offers are added to the stored index.
+class OfferIndex():
+    def __init__(self, bucket: S3BucketConnector, index_key: str) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.bucket = bucket
+        self.index_key = index_key
+        self.known_ids = np.array([], dtype=np.int64)
+        self.skipped = 0
+        self._claimed_ids = set()
+        self._scraped_ids = set()
+        self._lock = Lock()
+
+
+    def load(self) -> None:
+        self.known_ids = self.read_stored_ids()
+        self.logger.info(f'Offer index loaded with {len(self.known_ids)} offers.')
+
+
+    def read_stored_ids(self) -> np.ndarray:
+        try:
+            df = self.bucket.read_s3_to_df(self.index_key)
+            return np.sort(df['offer_id'].to_numpy(dtype=np.int64))
+        except self.bucket._no_such_key:
+            return np.array([], dtype=np.int64)
+
+
+    # Stored index is read again before saving, as other scraper pods may have updated it
+    def save(self) -> None:
+        with self._lock:
+            new_ids = np.fromiter(self._scraped_ids, dtype=np.int64, count=len(self._scraped_ids))
+        all_ids = np.union1d(self.read_stored_ids(), new_ids)
+        self.bucket.write_df_to_s3(pd.DataFrame({'offer_id': all_ids}), self.index_key)
+        self.logger.info(f'Offer index saved with {len(all_ids)} offers ({len(new_ids)} new, {self.skipped} known offers skipped).')
+
+
+    # Returns False if the offer was scraped before or was already claimed in this run
+    def claim(self, offer_id: str) -> bool:
+        if not offer_id.isdigit():
+            return True
+
+        offer_id = int(offer_id)
+        position = np.searchsorted(self.known_ids, offer_id)
+        with self._lock:
+            if (position < len(self.known_ids) and self.known_ids[position] == offer_id) or offer_id in self._claimed_ids:
+                self.skipped += 1
+                return False
+            self._claimed_ids.add(offer_id)
+            return True
+
+
+    def mark_scraped(self, offer_id: str) -> None:
+        if offer_id.isdigit():
+            with self._lock:
+                self._scraped_ids.add(int(offer_id))
@@ -0,0 +1,146 @@
+from bs4 import BeautifulSoup
+from .html_parser import HtmlParser
+from .metrics import ScraperMetrics
+from contextlib import contextmanager
+
+
+# Extracts rows of offer data from job and employer pages, used both while scraping
+# and when pages are reparsed from the page archive
+class OfferParser():
+    def __init__(self, html_parser: HtmlParser, metrics: ScraperMetrics=None) -> None:
+        self.html_parser = html_parser
+        self.metrics = metrics or ScraperMetrics()
+
+
+    # Returns one row per contract type of the offer
+    def parse_job(self, job_html: BeautifulSoup, job: dict, employer_data: list) -> list:
+        basic_job_data = self.get_basic_job_data(job_html, job)
+        categories_data = self.get_categories_data(job_html)
+        data_per_contract = self.get_contract_specific_data(job_html)
+
+        for contract in data_per_contract:
+            contract += basic_job_data + categories_data + employer_data
+
+        return data_per_contract
+
+
+    def get_basic_job_data(self, job_html: BeautifulSoup, job: dict) -> list:
+        job_link = job['link']
+        publish_date = job['publish_date']
+
+        offer_id = self.get_offer_id(job_link)
+
+        if len(job['regions']) > 0:
+            location = '|'.join(job['regions'])
+        else:
+            location_info = job_html.find('div', class_='offer-viewumlDlF').find('div').find_all()
+            location = location_info[0].text
+
+        try:
+            position_title = job_html.find('h1', class_='offer-viewkHIhn3').text
+        except AttributeError:
+            position_title = None
+
+        work_schedule, position_type, work_mode = [None]*3
+        benefit_list = job_html.find_all('div', class_='offer-viewXo2dpV')
+        for element in benefit_list:
+            if element['data-test'] == 'sections-benefit-work-schedule-text':
+                work_schedule = element.text
+            elif element['data-test'] == 'sections-benefit-employment-type-name-text':
+                position_type = element.text
+            elif element['data-test'] == 'sections-benefit-work-modes-text':
+                work_mode = element.text
+
+        return [offer_id, job_link, publish_date, position_title, location, work_schedule, work_mode, position_type]
+
+
+    def get_offer_id(self, job_link: str) -> str:
+        id_start_position = job_link.rfind(',') + 1
+        id_end_position = job_link.find('?', id_start_position)
+        return job_link[id_start_position:id_end_position]
+
+
+    def get_categories_data(self, job_html: BeautifulSoup) -> list:
+        categories = None
+
+        category_panel = job_html.find('ul', class_='offer-viewEmkiAc')
+        if category_panel is None:
+            return categories
+
+        category_tiles = category_panel.find_all('li', recursive=False)
+
+        for index, category in enumerate(category_tiles):
+            if index == 3:    #3 - subcategories
+                categories = category.find('a')['href'][-7:]
+                other_categories = category.find_all('a', class_='offer-vieweWtPBJ')
+                for other_category in other_categories:
+                    categories += ", " + other_category['href'][-7:]
+
+        return [categories]
+
+
+    # Returns None if the offer has no employer profile. Pages fetched without the browser have no employer
+    # profile block, the link is searched in their HTML instead
+    def get_employer_profile_link(self, job_html: BeautifulSoup, html: str=None) -> str:
+        employer_profile_link = job_html.find('a', class_='employer-profileiHwZjJ')
+        if employer_profile_link is None:
+            employer_profile_link = job_html.find('a', class_='ep-profile-link')
+
+        if employer_profile_link is None:
+            return self.html_parser.find_employer_profile_link(html) if html else None
+        return employer_profile_link['href']
+
+
+    def parse_employer_profile(self, html: str) -> list:
+        employer_name, employer_address, employer_tax_id = [None]*3
+        with self.metrics.timer('html_parse'):
+            employer_html = self.html_parser.parse(html, 'employer')
+
+        with self.ignored(AttributeError):
+            employer_name = employer_html.find('div', class_='title-container').find('h1').text
+        with self.ignored(AttributeError):
+            employer_data = employer_html.find('div', class_='box-content').find('div', class_='text')
+            with self.ignored(AttributeError):
+                employer_address = employer_data.find('p', itemprop='address').text
+            with self.ignored(AttributeError):
+                employer_tax_id = employer_data.find('p', itemprop='taxID').text
+
+        return [employer_name, employer_address, employer_tax_id]
+
+
+    def get_contract_specific_data(self, job_html: BeautifulSoup) -> list:
+        contracts_list = []
+
+        salaries = job_html.find_all('strong', class_='offer-viewLdvtPw')
+        salary_units = job_html.find_all('span', class_='offer-viewSGW6Yi')
+        contracts = job_html.find_all('div', class_='offer-vieweHKpRl')
+
+        if len(contracts) < 1:
+            contracts.append(None)
+            benefit_list = job_html.find_all('div', class_='offer-viewXo2dpV')
+            for element in benefit_list:
+                if element['data-test'] == 'sections-benefit-contracts-text':
+                    contracts[0] = element
+
+        for index, salary in enumerate(salaries):
+            salary_max, salary_min = [None]*2
+
+            with self.ignored(AttributeError):
+                salary_max = salary.find('span', class_='offer-viewYo2KTr').text
+            with self.ignored(AttributeError):
+                salary_min = salary.find('span', class_='offer-viewZGJhIB').text
+
+            contracts_list.append([contracts[index].text, salary_min, salary_max, salary_units[index].text])
+
+        if len(contracts_list) < 1:
+            contracts_list = [[None, None, None, None]]
+
+        return contracts_list
+
+
+    @contextmanager
+    def ignored(self, *exceptions):
+        try:
+            yield
+        except exceptions:
+            pass
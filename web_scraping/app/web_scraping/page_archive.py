@@ -0,0 +1,122 @@
+from ..common.s3 import S3BucketConnector
+from datetime import date, datetime, timezone
+from threading import Lock
+from uuid import uuid4
+import gzip
+import json
+import logging
+
+
+# Append-only archive of raw job and employer pages in WARC-like segments, so that data can be
+# reparsed without scraping the pages again. Every record is a separate gzip member with
+# WARC-style headers followed by the page, segments are written once and never modified:
+#   {archive_path}jobs/{publish_date}/segment_{timestamp}_{writer_id}_{number}.warc.gz
+#   {archive_path}employers/{fetch_date}/segment_{timestamp}_{writer_id}_{number}.warc.gz
+class PageArchive():
+    def __init__(self, bucket: S3BucketConnector, archive_path: str, segment_size_mb: float=16) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.bucket = bucket
+        self.archive_path = archive_path
+        self.segment_size = int(segment_size_mb * 1024 * 1024)
+        self.writer_id = uuid4().hex[:8]
+        self.records_written = 0
+        self._segments = {}     # compressed records per segment prefix
+        self._segment_sizes = {}
+        self._segment_numbers = {}
+        self._lock = Lock()
+
+
+    # Job pages are grouped by publish date, so that a date range can be reparsed
+    def add_job_page(self, job: dict, html: str, source: str) -> None:
+        headers = {'WARC-Target-URI': job['link'], 'WARC-Page-Type': 'job', 'WARC-Fetch-Source': source,
+                'WARC-Publish-Date': str(job['publish_date']), 'WARC-Regions': json.dumps(job['regions'])}
+        self.add_record(f"{self.archive_path}jobs/{job['publish_date']}/", headers, html)
+
+
+    def add_employer_page(self, url: str, html: str) -> None:
+        headers = {'WARC-Target-URI': url, 'WARC-Page-Type': 'employer', 'WARC-Fetch-Source': 'http'}
+        self.add_record(f'{self.archive_path}employers/{date.today()}/', headers, html)
+
+
+    # Records are compressed when added (in the scraping threads) and written when the segment is full
+    def add_record(self, prefix: str, headers: dict, html: str) -> None:
+        body = html.encode('utf-8')
+        record_headers = {'WARC-Type': 'resource', 'WARC-Record-ID': f'<urn:uuid:{uuid4()}>',
+                        'WARC-Date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                        **headers, 'Content-Type': 'text/html; charset=utf-8', 'Content-Length': str(len(body))}
+        header_lines = ''.join(f'{name}: {value}\r\n' for name, value in record_headers.items())
+        record = gzip.compress(f'WARC/1.0\r\n{header_lines}\r\n'.encode('utf-8') + body + b'\r\n\r\n')
+
+        with self._lock:
+            records = self._segments.setdefault(prefix, [])
+            records.append(record)
+            self._segment_sizes[prefix] = self._segment_sizes.get(prefix, 0) + len(record)
+            if self._segment_sizes[prefix] >= self.segment_size:
+                self.write_segment(prefix)
+
+
+    # Writes buffered records of the prefix as a new segment
+    def write_segment(self, prefix: str) -> None:
+        records = self._segments.pop(prefix, [])
+        self._segment_sizes.pop(prefix, None)
+        if len(records) < 1:
+            return
+        number = self._segment_numbers.get(prefix, 0)
+        self._segment_numbers[prefix] = number + 1
+        timestamp = datetime.today().strftime('%Y%m%d_%H%M%S')
+        key = f'{prefix}segment_{timestamp}_{self.writer_id}_{number:04d}.warc.gz'
+        self.bucket.write_bytes_to_s3(b''.join(records), key)
+        self.records_written += len(records)
+        self.logger.debug(f"Archive segment '{key}' was written with {len(records)} records.")
+
+
+    # Writes all buffered records, called before scraped dates are marked as processed
+    def flush(self) -> None:
+        with self._lock:
+            for prefix in list(self._segments):
+                self.write_segment(prefix)
+
+
+    def get_job_segment_keys(self, publish_date: date) -> list:
+        return sorted(file.key for file in self.bucket.get_prefix_files(f'{self.archive_path}jobs/{publish_date}/'))
+
+
+    def get_employer_segment_keys(self) -> list:
+        return sorted(file.key for file in self.bucket.get_prefix_files(f'{self.archive_path}employers/'))
+
+
+    # Yields (headers, html) of every record in the segment
+    def read_segment(self, key: str):
+        data = gzip.decompress(self.bucket.read_s3_to_bytes(key))
+        position = 0
+        while position < len(data):
+            header_end = data.index(b'\r\n\r\n', position)
+            header_lines = data[position:header_end].decode('utf-8').split('\r\n')[1:]
+            headers = dict(line.split(': ', 1) for line in header_lines)
+            body_start = header_end + 4
+            body_end = body_start + int(headers['Content-Length'])
+            yield headers, data[body_start:body_end].decode('utf-8')
+            position = body_end + 4
+
+
+    # Yields (job, html) of job pages in the segment, job is the dict used by the scraper
+    def read_job_pages_of_segment(self, key: str, publish_date: date):
+        for headers, html in self.read_segment(key):
+            job = {'link': headers['WARC-Target-URI'], 'publish_date': publish_date,
+                'regions': json.loads(headers['WARC-Regions'])}
+            yield job, html
+
+
+    # Returns the latest archived page of every employer profile in links by its URL. Segments are read one at
+    # a time and only pages of the links are kept. Pages are compared by their record time, pages archived
+    # in the same second by the order of their segment keys.
+    def read_employer_pages(self, links: set) -> dict:
+        employer_pages = {}
+        record_dates = {}
+        for key in self.get_employer_segment_keys():
+            for headers, html in self.read_segment(key):
+                url = headers['WARC-Target-URI']
+                if url in links and headers['WARC-Date'] >= record_dates.get(url, ''):
+                    employer_pages[url] = html
+                    record_dates[url] = headers['WARC-Date']
+        return employer_pages
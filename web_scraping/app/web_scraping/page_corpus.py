@@ -0,0 +1,125 @@
+import requests
+from requests.adapters import HTTPAdapter
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from bs4 import BeautifulSoup
+from ..common.s3 import S3BucketConnector
+from urllib.parse import urldefrag
+from hashlib import sha1
+import soupsieve as sv
+import json
+
+
+# Raw HTML of scraped pages keyed by their URL (without fragment), stored in S3 or in a local bucket stand-in.
+# Pages loaded with the browser and fetched over HTTP are kept apart, as their HTML differs.
+class PageCorpus():
+    def __init__(self, bucket: S3BucketConnector, corpus_path: str) -> None:
+        self.bucket = bucket
+        self.corpus_path = corpus_path
+
+
+    def save(self, url: str, html: bytes, source: str) -> None:
+        self.bucket.write_bytes_to_s3(html, self.get_page_key(url, source))
+
+
+    # Returns None if the page was not recorded
+    def load(self, url: str, source: str) -> bytes:
+        return self.bucket.read_s3_to_bytes(self.get_page_key(url, source))
+
+
+    # Parameters of the recorded run (e.g. scraped dates) needed to replay it
+    def save_manifest(self, manifest: dict) -> None:
+        self.bucket.write_bytes_to_s3(json.dumps(manifest).encode('utf-8'), f'{self.corpus_path}manifest.json')
+
+
+    def load_manifest(self) -> dict:
+        return json.loads(self.bucket.read_s3_to_bytes(f'{self.corpus_path}manifest.json'))
+
+
+    def get_page_key(self, url: str, source: str) -> str:
+        url = urldefrag(url)[0]
+        return f"{self.corpus_path}{source}/{sha1(url.encode('utf-8')).hexdigest()}.html"
+
+
+# Wraps Chrome driver and records page source under the URL of the loaded page every time it is read
+class RecordingDriver():
+    def __init__(self, driver, corpus: PageCorpus) -> None:
+        self.driver = driver
+        self.corpus = corpus
+        self.current_url = None
+
+
+    def get(self, url: str) -> None:
+        self.current_url = url
+        self.driver.get(url)
+
+
+    @property
+    def page_source(self) -> str:
+        page_source = self.driver.page_source
+        self.corpus.save(self.current_url, page_source.encode('utf-8'), 'browser')
+        return page_source
+
+
+    def __getattr__(self, name: str):
+        return getattr(self.driver, name)
+
+
+# Serves recorded pages in place of Chrome driver. Supports the calls used by the scraper and WebDriverWait.
+class ReplayDriver():
+    def __init__(self, corpus: PageCorpus) -> None:
+        self.corpus = corpus
+        self.page_source = ''
+        self._soup = None
+
+
+    def get(self, url: str) -> None:
+        html = self.corpus.load(url, 'browser')
+        self.page_source = html.decode('utf-8') if html is not None else '<html></html>'
+        self._soup = None
+
+
+    def find_element(self, by: str=By.CSS_SELECTOR, value: str=None):
+        if by != By.CSS_SELECTOR:
+            raise NotImplementedError(f"Replay driver supports only CSS selectors, not '{by}'.")
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.page_source, 'lxml')
+        element = sv.select_one(value, self._soup)
+        if element is None:
+            raise NoSuchElementException(value)
+        return element
+
+
+    def quit(self) -> None:
+        pass
+
+
+# Records bodies of successful responses fetched without the browser
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, corpus: PageCorpus, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.corpus = corpus
+
+
+    def send(self, request, **kwargs) -> requests.Response:
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            self.corpus.save(request.url, response.content, 'http')
+        return response
+
+
+# Serves recorded pages to requests sessions, pages which were not recorded are returned as 404
+class ReplayAdapter(HTTPAdapter):
+    def __init__(self, corpus: PageCorpus, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.corpus = corpus
+
+
+    def send(self, request, **kwargs) -> requests.Response:
+        content = self.corpus.load(request.url, 'http')
+        response = requests.Response()
+        response.status_code = 200 if content is not None else 404
+        response._content = content if content is not None else b''
+        response.url = request.url
+        response.request = request
+        return response
@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+from collections import deque
+from threading import Condition
+import time
+import logging
+
+
+# Token bucket (requests per second) combined with a concurrency limit, both adjusted with AIMD:
+# every request finished within latency_target additively increases them, when the share of failed
+# requests among the last window ones exceeds error_threshold they are divided by decrease_factor.
+class RateController():
+    def __init__(self, name: str, congestion_errors: tuple, latency_target: float, initial_rate: float=1,
+                min_rate: float=0.1, max_rate: float=10, rate_increase: float=0.1, initial_concurrency: int=1,
+                max_concurrency: int=4, window: int=20, error_threshold: float=0.2, decrease_factor: float=2,
+                log_interval: float=60) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.congestion_errors = congestion_errors
+        self.latency_target = latency_target
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_increase = rate_increase
+        self.concurrency = float(initial_concurrency)
+        self.max_concurrency = max_concurrency
+        self.error_threshold = error_threshold
+        self.decrease_factor = max(1.1, decrease_factor)
+        self.log_interval = log_interval
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self._outcomes = deque(maxlen=window)
+        self._last_refill = time.monotonic()
+        self._last_log = time.monotonic()
+        self._condition = Condition()
+
+
+    # Wraps a single fetch: waits for a token and a free slot, then records latency and outcome
+    @contextmanager
+    def limit(self):
+        self.acquire()
+        start = time.monotonic()
+        failed = False
+        try:
+            yield
+        except self.congestion_errors:
+            failed = True
+            raise
+        finally:
+            self.release(time.monotonic() - start, failed)
+
+
+    def acquire(self) -> None:
+        with self._condition:
+            while True:
+                self.refill()
+                if self.in_flight < int(self.concurrency) and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate if self.tokens < 1 else None
+                self._condition.wait(timeout=wait_time)
+
+
+    def release(self, latency: float, failed: bool) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self.requests += 1
+            self.failures += int(failed)
+            self._outcomes.append(failed)
+
+            error_rate = sum(self._outcomes) / len(self._outcomes)
+            if failed and len(self._outcomes) >= 5 and error_rate > self.error_threshold:
+                self.decrease(error_rate)
+            elif not failed and latency <= self.latency_target:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1/self.concurrency)
+                self.rate = min(self.max_rate, self.rate + self.rate_increase/self.rate)
+
+            if time.monotonic() - self._last_log >= self.log_interval:
+                self.log_state()
+            self._condition.notify_all()
+
+
+    def decrease(self, error_rate: float) -> None:
+        self.concurrency = max(1.0, self.concurrency / self.decrease_factor)
+        self.rate = max(self.min_rate, self.rate / self.decrease_factor)
+        self.tokens = min(self.tokens, 0.0)
+        # Next decrease needs new evidence, otherwise one burst of errors would collapse the rate
+        self._outcomes.clear()
+        self.logger.warning(f'{self.name} error rate reached {error_rate:.0%}. Rate was decreased to '
+                            f'{self.rate:.2f} requests/s with concurrency {int(self.concurrency)}.')
+
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        capacity = max(1.0, self.rate)
+        self.tokens = min(capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+
+    def log_state(self) -> None:
+        self._last_log = time.monotonic()
+        self.logger.info(f'{self.name} rate: {self.rate:.2f} requests/s, concurrency: {int(self.concurrency)}, '
+                        f'requests: {self.requests}, failed: {self.failures}.')
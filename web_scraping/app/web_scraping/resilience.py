@@ -0,0 +1,147 @@
+from .metrics import ScraperMetrics
+from threading import Lock
+import random
+import time
+import logging
+
+
+# Point in time by which an operation has to finish, None seconds means no deadline.
+# Timeouts of single requests are capped by the deadline of the whole operation (e.g. the run).
+class Deadline():
+    def __init__(self, seconds: float=None) -> None:
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds if seconds is not None else None
+
+
+    def remaining(self) -> float:
+        if self.expires is None:
+            return float('inf')
+        return max(0.0, self.expires - time.monotonic())
+
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+    def cap(self, timeout: float) -> float:
+        return min(timeout, self.remaining())
+
+
+    # Deadline of a part of the operation which ends within seconds or with the operation
+    def child(self, seconds: float) -> 'Deadline':
+        return Deadline(self.cap(seconds))
+
+
+# Retries failed calls with exponential backoff with full jitter. Retries are limited by the budget
+# shared by all calls: at most min_retries plus budget_ratio of all calls, so that a failing site
+# is not flooded with retries, and by the deadline of the call.
+class RetryPolicy():
+    def __init__(self, max_attempts: int=3, base_delay: float=1, max_delay: float=30, budget_ratio: float=0.1,
+                min_retries: int=10, metrics: ScraperMetrics=None) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_retries = min_retries
+        self.metrics = metrics or ScraperMetrics()
+        self.calls = 0
+        self.retries = 0
+        self._lock = Lock()
+
+
+    def call(self, name: str, func, retryable_errors: tuple, deadline: Deadline=None):
+        with self._lock:
+            self.calls += 1
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except retryable_errors:
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**(attempt-1)))
+                if attempt >= self.max_attempts:
+                    self.metrics.count(f'{name}_retries_exhausted')
+                    raise
+                if deadline is not None and deadline.remaining() <= delay:
+                    self.metrics.count(f'{name}_deadline_expired')
+                    raise
+                if not self.take_retry():
+                    self.metrics.count(f'{name}_retry_budget_exhausted')
+                    raise
+            self.metrics.count(f'{name}_retries')
+            time.sleep(delay)
+            attempt += 1
+
+
+    def take_retry(self) -> bool:
+        with self._lock:
+            if self.retries >= self.min_retries + self.budget_ratio * self.calls:
+                return False
+            self.retries += 1
+            return True
+
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {'calls': self.calls, 'retries': self.retries,
+                    'budget': int(self.min_retries + self.budget_ratio * self.calls)}
+
+
+# Stops calls to a failing endpoint: after failure_threshold consecutive failures the circuit opens and calls
+# are skipped for reset_timeout seconds, then one trial call is let through and closes the circuit if it succeeds.
+class CircuitBreaker():
+    def __init__(self, name: str, failure_threshold: int=5, reset_timeout: float=60, metrics: ScraperMetrics=None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.metrics = metrics or ScraperMetrics()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened = 0
+        self.skipped = 0
+        self._opened_at = None
+        self._lock = Lock()
+
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                return True
+            if self.state != 'closed':
+                self.skipped += 1
+                self.metrics.count(f'{self.name}_circuit_skipped')
+                return False
+            return True
+
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != 'closed':
+                self.logger.info(f'{self.name} circuit was closed.')
+            self.state = 'closed'
+            self.failures = 0
+
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                self.metrics.count(f'{self.name}_circuit_opened')
+                self.logger.warning(f'{self.name} circuit was opened after {self.failures} failures, '
+                                    f'calls are skipped for {self.reset_timeout} seconds.')
+
+
+    # Trial call which ended without an outcome (e.g. its deadline expired) lets the next call be the trial
+    def release(self) -> None:
+        with self._lock:
+            if self.state == 'half-open':
+                self.state = 'open'
+
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {'state': self.state, 'opened': self.opened, 'skipped': self.skipped}
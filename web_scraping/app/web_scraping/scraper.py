@@ -1,21 +1,36 @@
-import requests
-from bs4 import BeautifulSoup, Tag, ResultSet
+from bs4 import BeautifulSoup, Tag
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from ..common.custom_exceptions import TagNotFoundException
 from ..common.s3 import S3BucketConnector
 from ..common.meta_process import MetaProcess
-from io import StringIO
+from ..common.shard_lease import ShardLease
+from ..common.local_bucket import LocalBucketConnector
+from .driver_pool import DriverPool
+from .employer_cache import EmployerCache
+from .http_fetcher import HttpFetcher, DeadlineExpiredError
+from .batch_writer import RecordBatchWriter
+from .offer_index import OfferIndex
+from .html_parser import HtmlParser
+from .rate_controller import RateController
+from .metrics import ScraperMetrics
+from .page_corpus import PageCorpus, RecordingDriver, ReplayDriver, RecordingAdapter, ReplayAdapter
+from .offer_parser import OfferParser
+from .page_archive import PageArchive
+from .browser_profile import BrowserProfile
+from .resilience import Deadline, RetryPolicy, CircuitBreaker
 from datetime import date, datetime
-import pandas as pd
+import json
 import logging
-from csv import writer
-from contextlib import contextmanager 
+from contextlib import nullcontext
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 
 
@@ -24,101 +39,371 @@ class WebScraper():
                 month_names: dict, target_bucket: S3BucketConnector, metafile_key: str, 
                 start_date: str, end_date: str=date.today(), webdriver_path: str='',
                 target_file_format: str='parquet', parser: str='lxml', 
-                sleep_multiplier: int=2, date_format: str='%Y-%m-%d') -> None:
+                sleep_multiplier: int=2, date_format: str='%Y-%m-%d', driver_pool_size: int=1,
+                employer_cache_key: str='', employer_cache_ttl_days: int=30, employer_cache_max_size: int=5000,
+                http_max_connections: int=10, http_max_connections_per_host: int=4, http_timeout: float=10,
+                fetch_mode: str='browser', locate_start_page: bool=False, rows_per_part: int=5000,
+                offer_index_key: str='', staging_path: str='', shard_lease_prefix: str='', shard_days: int=1, shard_lease_ttl_minutes: int=60,
+                rate_control: dict=None, metrics_target_path: str='', metrics_file_path: str='',
+                corpus_mode: str='', corpus_path: str='', corpus_local_dir: str='',
+                archive_path: str='', archive_segment_size_mb: float=16, browser_profile: dict=None,
+                driver_max_pages: int=0, driver_max_memory_mb: float=0, driver_memory_check_pages: int=10,
+                run_budget_minutes: float=0, page_load_timeout: float=30, tag_wait_timeout: float=5, page_deadline: float=60,
+                retry: dict=None, employer_circuit_breaker: dict=None) -> None:
         self.logger = logging.getLogger(__name__)
-        self.chrome_options = self.get_chrome_options()
-        if webdriver_path:  # Run locally
-            self.driver = webdriver.Chrome(service=Service(webdriver_path), options=self.chrome_options)
-        else:               # Run from Docker container
-            self.driver = webdriver.Chrome(options=self.chrome_options)
+        self.metrics = ScraperMetrics()
+        self.browser_profile = BrowserProfile(**(browser_profile or {}))
+        self.chrome_options = self.browser_profile.get_chrome_options()
+        self.webdriver_path = webdriver_path
+        self.page_load_timeout = page_load_timeout
+        # Pages can be recorded to (or replayed from) corpus in the target bucket or in a local directory
+        self.corpus_mode = corpus_mode
+        self.page_corpus = None
+        if corpus_mode:
+            corpus_bucket = LocalBucketConnector(corpus_local_dir, '') if corpus_local_dir else target_bucket
+            self.page_corpus = PageCorpus(corpus_bucket, corpus_path)
+        self.driver_pool = DriverPool(driver_pool_size, self.create_driver, driver_max_pages, driver_max_memory_mb,
+                                    driver_memory_check_pages, self.metrics)
+        self.http_fetcher = HttpFetcher(http_max_connections, http_max_connections_per_host, http_timeout,
+                                        adapter=self.get_http_adapter(http_max_connections))
+        # Employer profiles of the offers from one listing page are fetched concurrently
+        self.employer_executor = ThreadPoolExecutor(max_workers=http_max_connections)
         self.source_link = source_link
         self.month_names = month_names
         self.column_headers = column_headers
         self.parser = parser
+        self.html_parser = HtmlParser(parser)
         self.target_bucket = target_bucket
         self.target_file_format = target_file_format
+        self.rows_per_part = rows_per_part
+        self.staging_path = staging_path
         self.start_date = datetime.strptime(start_date, date_format).date()
         if type(end_date) == str:
             end_date = datetime.strptime(end_date, date_format).date()
         self.end_date = end_date
         self.running = False
         self.sleep_multiplier = sleep_multiplier
+        # Fetch rates are divided by sleep_multiplier when fetches start failing. Browser fetches fail with timeouts and
+        # errors of the navigation, pages loaded without the required tags are dropped offers (not congestion)
+        rate_control = rate_control or {}
+        self.browser_rate = RateController('Browser', (TimeoutException, WebDriverException), 
+                                        decrease_factor=sleep_multiplier, **rate_control.get('browser', {'latency_target': 10}))
+        self.http_rate = RateController('HTTP', HttpFetcher.congestion_errors, 
+                                        decrease_factor=sleep_multiplier, **rate_control.get('http', {'latency_target': 2}))
         self.metafile_key = metafile_key
+        # Run stops scraping new pages after run_budget_minutes, every page and its retries have to finish within page_deadline
+        self.run_budget = run_budget_minutes * 60 if run_budget_minutes else None
+        self.run_deadline = Deadline(self.run_budget)
+        self.run_budget_exhausted = False
+        # Links of offers postponed to the next run in the current shard
+        self.postponed_links = set()
+        self.tag_wait_timeout = tag_wait_timeout
+        self.page_deadline = page_deadline
+        self.retry_policy = RetryPolicy(**(retry or {}), metrics=self.metrics)
+        self.employer_breaker = CircuitBreaker('employer_fetch', **(employer_circuit_breaker or {}), metrics=self.metrics)
+        if corpus_mode == 'record':
+            self.page_corpus.save_manifest({'source_link': source_link, 'start_date': str(self.start_date), 'end_date': str(self.end_date)})
+        self.fetch_mode = fetch_mode
+        self.locate_start_page = locate_start_page
+        self.offer_parser = OfferParser(self.html_parser, self.metrics)
+        self.metrics_target_path = metrics_target_path
+        self.metrics_file_path = metrics_file_path
+        self.fetch_counts = Counter()
+        self._fetch_counts_lock = Lock()
+        self.employer_cache = None
+        if employer_cache_key:
+            self.employer_cache = EmployerCache(target_bucket, employer_cache_key, employer_cache_ttl_days, employer_cache_max_size)
+        self.offer_index = None
+        if offer_index_key:
+            self.offer_index = OfferIndex(target_bucket, offer_index_key)
+        self.shard_lease = None
+        if shard_lease_prefix:
+            self.shard_lease = ShardLease(target_bucket, shard_lease_prefix, shard_days, shard_lease_ttl_minutes)
+        # Raw job and employer pages are archived to be reparsed later (see reparse.py)
+        self.page_archive = None
+        if archive_path:
+            self.page_archive = PageArchive(target_bucket, archive_path, archive_segment_size_mb)
     
     
-    def get_chrome_options(self) -> Options:
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        prefs = {"profile.managed_default_content_settings.images": 2}
-        chrome_options.add_experimental_option("prefs", prefs)
-        return chrome_options
-        
-        
+    def create_driver(self):
+        if self.corpus_mode == 'replay':
+            return ReplayDriver(self.page_corpus)
+
+        if self.webdriver_path:  # Run locally
+            driver = webdriver.Chrome(service=Service(self.webdriver_path), options=self.chrome_options)
+        else:                    # Run from Docker container
+            driver = webdriver.Chrome(options=self.chrome_options)
+        driver.set_page_load_timeout(self.page_load_timeout)
+        self.browser_profile.apply(driver)
+
+        if self.corpus_mode == 'record':
+            return RecordingDriver(driver, self.page_corpus)
+        return driver
+
+
+    # Returns None to use the default adapter of the HTTP fetcher
+    def get_http_adapter(self, max_connections: int) -> HTTPAdapter:
+        if self.corpus_mode == 'record':
+            return RecordingAdapter(self.page_corpus, pool_connections=max_connections, pool_maxsize=max_connections)
+        elif self.corpus_mode == 'replay':
+            return ReplayAdapter(self.page_corpus)
+        return None
+
+
     # main function
     def scrape(self) -> None:
-        all_data = [self.column_headers]
-        current_page = 1
+        self.run_deadline = Deadline(self.run_budget)
         scrape_dates = MetaProcess.get_dates(self.start_date, self.end_date, self.target_bucket, self.logger, self.metafile_key)
+        if len(scrape_dates) > 0: 
+            if self.employer_cache is not None:
+                self.employer_cache.load()
+            if self.offer_index is not None:
+                self.offer_index.load()
+
+        if self.shard_lease is None:
+            self.scrape_shard(scrape_dates)
+        else:
+            for shard_id, shard_dates in self.shard_lease.claim_shards(scrape_dates):
+                try:
+                    if self.run_deadline.expired():
+                        break
+                    # Dates could have been scraped by other pod since the scrape dates were read
+                    processed_dates = MetaProcess.get_processed_dates(self.target_bucket, self.metafile_key)
+                    shard_dates = [shard_date for shard_date in shard_dates if shard_date not in processed_dates]
+                    if len(shard_dates) > 0:
+                        self.scrape_shard(shard_dates, shard_id)
+                finally:
+                    self.shard_lease.release(shard_id)
+
+        if self.employer_cache is not None and len(scrape_dates) > 0:
+            self.employer_cache.save()
+        if self.fetch_mode == 'hybrid':
+            self.log_fallback_rate()
+        self.browser_rate.log_state()
+        self.http_rate.log_state()
+        self.log_browser_profile_effect()
+        self.driver_pool.log_state()
+        self.write_metrics()
+
+
+    # Scrapes offers published on scrape_dates (sorted from the newest) into one data file
+    def scrape_shard(self, scrape_dates: list, shard_id: str='') -> None:
+        batch_writer = RecordBatchWriter(self.target_bucket, self.column_headers, self.start_date, self.end_date, 
+                                        self.target_file_format, self.rows_per_part, shard_id, self.metrics, self.staging_path)
+        current_page = 1
+        probed_pages = {}
+        self.postponed_links = set()
         if len(scrape_dates) > 0: 
             self.running = True
+            if self.locate_start_page:
+                current_page = self.find_start_page(max(scrape_dates), probed_pages)
 
         while self.running == True:
+            if self.run_deadline.expired():
+                self.run_budget_exhausted = True
+                break
             page_link = f'{self.source_link}&pn={current_page}'
-            soup = self.get_soup(page_link)
+            soup = probed_pages.pop(current_page, None)
+            if soup is None:
+                soup = self.get_soup(page_link)
+            self.metrics.count('pages')
 
             try:
-                job_offers = self.get_job_offers_from_page(soup)
-                last_job_publish_date = self.extract_job_publish_date(job_offers[-1])
+                dated_job_offers = self.get_dated_job_offers(soup)
+                last_job_publish_date = dated_job_offers[-1][1]
                 links = list()
-                if last_job_publish_date <= self.end_date:
-                    links = self.extract_job_links(job_offers, scrape_dates)
+                if last_job_publish_date <= max(scrape_dates):
+                    links = self.extract_job_links(dated_job_offers, scrape_dates)
             except AttributeError:
                 self.logger.exception(f"Tag was not found in the HTML of the current page. Please check if the HTML of the source webpage was changed: {page_link}")
                 raise TagNotFoundException
 
-            for job in links:
-                try:
-                    data_per_contract = self.extract_job_data(job)
-                    all_data += data_per_contract
-                except TagNotFoundException:
-                    pass
-
+            # Job pages are loaded in parallel, then their employer profiles are fetched concurrently.
+            # Results are written in the order of links
+            loaded_jobs = self.driver_pool.map(self.load_job, links)
+            for job, data_per_contract in zip(links, self.parse_jobs(links, loaded_jobs)):
+                batch_writer.write_rows(data_per_contract)
+                self.metrics.count('rows', len(data_per_contract))
+                if self.offer_index is not None and data_per_contract:
+                    self.offer_index.mark_scraped(self.offer_parser.get_offer_id(job['link']))
                 
             if self.running == True:
                 next_button = soup.find('li', class_='pagination_element pagination_element--next')
                 if not next_button:     # if more pages
                     self.running = False
+            if shard_id:
+                self.shard_lease.renew(shard_id)
 
             current_page += 1
 
-        if len(all_data) > 1:
-            df = self.write_to_df(all_data)
-            file_key = self.target_bucket.generate_file_key(self.start_date, self.end_date, self.target_file_format)    
-            self.target_bucket.write_df_to_s3(df, file_key)
-            MetaProcess.update_meta_file(self.target_bucket, self.logger, self.metafile_key, scrape_dates)
-            self.logger.info(f"Scraping finished. File '{file_key}' was created with {len(all_data)-1} records.")
+        batch_writer.close()
+        if self.run_budget_exhausted:
+            self.logger.warning(f'Run budget of {self.run_budget/60:.1f} minutes was exhausted, scraping of {scrape_dates[-1]} - {scrape_dates[0]} '
+                                'stopped. The dates are not marked as scraped and will be scraped again in the next run.')
+        if self.postponed_links:
+            self.logger.warning(f'{len(self.postponed_links)} offers were postponed, because their employer profiles could not be fetched. '
+                                f'Dates {scrape_dates[-1]} - {scrape_dates[0]} are not marked as scraped and will be scraped again in the next run.')
+        dates_complete = not self.run_budget_exhausted and not self.postponed_links
+        if self.page_archive is not None:
+            self.page_archive.flush()
+        if batch_writer.rows_written > 0 and not dates_complete and self.offer_index is None:
+            # Without the offer index the offers would be scraped again with the dates into new parts
+            if batch_writer.discard():
+                self.logger.info(f'{batch_writer.rows_written} records of the unfinished dates were discarded.')
+            else:
+                self.logger.warning(f'{batch_writer.rows_written} records of the unfinished dates were written without the staging path, '
+                                    'they will be duplicated when the dates are scraped again.')
+        elif batch_writer.rows_written > 0:
+            # Metafiles are shared by all pods scraping in parallel. Parts are moved to the target path
+            # right before the scraped dates and offers are saved, so they are not scraped again into new parts
+            with self.shard_lease.lock('metafile') if shard_id else nullcontext():
+                part_keys = batch_writer.publish()
+                if dates_complete:
+                    MetaProcess.update_meta_file(self.target_bucket, self.logger, self.metafile_key, scrape_dates)
+                if self.offer_index is not None:
+                    self.offer_index.save()
+            self.logger.info(f"Scraping finished. {len(part_keys)} file(s) from '{part_keys[0]}' to '{part_keys[-1]}' were created with {batch_writer.rows_written} records.")
         else:
             self.logger.info('No new records were found. The data file was not created.')
 
 
+    # Writes stage durations and counters as JSON to S3 and in Prometheus text format to a local file
+    def write_metrics(self) -> None:
+        summary = self.metrics.summary()
+        summary['browser_profile'] = self.browser_profile.name
+        summary['run_budget'] = {'budget_seconds': self.run_budget, 'exhausted': self.run_budget_exhausted}
+        summary['retries'] = self.retry_policy.summary()
+        summary['circuit_breakers'] = {self.employer_breaker.name: self.employer_breaker.summary()}
+        self.logger.info(f"{summary['retries']['retries']} of {summary['retries']['calls']} page loads and fetches were retried "
+                        f"(budget: {summary['retries']['budget']}), employer circuit was opened {summary['circuit_breakers']['employer_fetch']['opened']} "
+                        f"times and skipped {summary['circuit_breakers']['employer_fetch']['skipped']} fetches.")
+        self.logger.info(f"Scraped {summary['pages_per_minute']:.1f} pages and {summary['offers_per_minute']:.1f} offers per minute, "
+                        f"{summary['counters'].get('offers_dropped', 0)} offers were dropped and {summary['counters'].get('offers_postponed', 0)} postponed.")
+        if self.metrics_target_path:
+            today_date = datetime.today().strftime('%Y%m%d_%H%M%S')
+            key = f'{self.metrics_target_path}scraper_metrics_{today_date}.json'
+            self.target_bucket.write_bytes_to_s3(json.dumps(summary, indent=2).encode('utf-8'), key)
+        if self.metrics_file_path:
+            with open(self.metrics_file_path, 'w') as metrics_file:
+                metrics_file.write(self.metrics.to_prometheus(summary))
+
+
+    def quit(self) -> None:
+        self.driver_pool.quit()
+        self.employer_executor.shutdown(wait=True)
+        self.http_fetcher.close()
+
+
     def get_soup(self, page_link: str) -> BeautifulSoup:
-        self.driver.get(page_link)
-        html = self.driver.page_source
-        soup = BeautifulSoup(html, self.parser)
+        if self.fetch_mode == 'hybrid':
+            soup, _ = self.get_static_soup(page_link, 'listing')
+            if soup is not None:
+                return soup
+
+        deadline = self.run_deadline.child(self.page_deadline)
+        html = self.retry_policy.call('listing_load', lambda: self.load_listing_page(page_link, deadline), (TimeoutException,), deadline)
+        with self.metrics.timer('html_parse'):
+            soup = self.html_parser.parse(html, 'listing')
         return soup
 
 
-    def get_job_offers_from_page(self, soup: BeautifulSoup) -> ResultSet:
+    def load_listing_page(self, page_link: str, deadline: Deadline) -> str:
+        with self.driver_pool.acquire() as driver, self.browser_rate.limit():
+            with self.metrics.timer('listing_load'):
+                driver.get(page_link)
+                # Page is returned before it is fully loaded, missing tags are reported when it is parsed
+                if self.browser_profile.page_load_strategy == 'eager':
+                    self.wait_for_tags(driver, 'listing', deadline.cap(self.tag_wait_timeout))
+            self.count_browser_page(driver)
+            return driver.page_source
+
+
+    # Returns soup and HTML of the page fetched over plain HTTP or None soup if the browser is needed to render it
+    def get_static_soup(self, page_link: str, page_type: str) -> tuple:
+        soup, html = None, None
+        try:
+            with self.http_rate.limit(), self.metrics.timer(f'{page_type}_load'):
+                html = self.http_fetcher.get(page_link)
+            with self.metrics.timer('html_parse'):
+                soup = self.html_parser.parse(html, page_type)
+            if not self.html_parser.has_required_tags(soup, page_type):
+                soup = None
+        except HttpFetcher.errors:
+            pass
+
+        with self._fetch_counts_lock:
+            self.fetch_counts[f'{page_type}_pages'] += 1
+            if soup is None:
+                self.fetch_counts[f'{page_type}_fallbacks'] += 1
+        return soup, html
+
+
+    def log_fallback_rate(self) -> None:
+        for page_type in ['listing', 'job']:
+            pages = self.fetch_counts[f'{page_type}_pages']
+            fallbacks = self.fetch_counts[f'{page_type}_fallbacks']
+            if pages > 0:
+                self.logger.info(f'{fallbacks} of {pages} {page_type} pages fell back to the browser ({fallbacks/pages:.1%}).')
+
+
+    # Offers are sorted from the newest, so pages before the first one with an offer published
+    # on or before the newest scrape date can be skipped. The page is found with exponential
+    # and then binary search, probed soups are stored in probed_pages to be reused.
+    def find_start_page(self, newest_scrape_date: date, probed_pages: dict) -> int:
+        # True if the page reaches newest_scrape_date or is past the last page
+        def reaches_date(page: int) -> bool:
+            if page not in probed_pages:
+                probed_pages[page] = self.get_soup(f'{self.source_link}&pn={page}')
+            publish_dates = self.get_first_last_publish_date(probed_pages[page])
+            if publish_dates is None:
+                return True
+            self.logger.debug(f'Page {page} has offers published between {publish_dates[1]} and {publish_dates[0]}.')
+            return publish_dates[1] <= newest_scrape_date
+
+        low, high = 0, 1    # reaches_date(low) is False, reaches_date(high) is True after the search
+        while not reaches_date(high):
+            low, high = high, high*2
+        while high - low > 1:
+            middle = (low + high) // 2
+            if reaches_date(middle):
+                high = middle
+            else:
+                low = middle
+
+        # If there are no offers on the found page, scraping starts from the last existing one
+        if self.get_first_last_publish_date(probed_pages[high]) is None:
+            high = max(1, low)
+        self.logger.info(f'Scraping starts from page {high} ({len(probed_pages)} pages probed).')
+        for page in list(probed_pages):
+            if page != high:
+                del probed_pages[page]
+        return high
+
+
+    # Returns publish dates of the first and last offer on the page or None if there are no offers
+    def get_first_last_publish_date(self, soup: BeautifulSoup) -> tuple:
+        try:
+            dated_job_offers = self.get_dated_job_offers(soup)
+            if len(dated_job_offers) < 1:
+                return None
+            return dated_job_offers[0][1], dated_job_offers[-1][1]
+        except AttributeError:
+            return None
+
+
+    def get_job_offers_from_page(self, soup: BeautifulSoup) -> list:
         search_result = soup.find('div', class_='results')
-        jobs_offers = search_result.find_all(
-                lambda tag: tag.name == 'li' and tag.get('class') == ['results__list-container-item'])
+        jobs_offers = self.html_parser.select_job_offers(search_result)
         return jobs_offers
 
 
+    # Returns (job, publish_date) pairs, so publish date of each offer is extracted only once
+    def get_dated_job_offers(self, soup: BeautifulSoup) -> list:
+        return [(job, self.extract_job_publish_date(job)) for job in self.get_job_offers_from_page(soup)]
+
+
     def extract_job_publish_date(self, job: Tag) -> date:
-        publish_date = job.find('span', class_='offer-actions__date').find_all(text=True)
+        publish_date = job.find('span', class_='offer-actions__date').find_all(string=True)
         if len(publish_date) < 5:
             publish_date.insert(0, ' ')
 
@@ -131,12 +416,10 @@ class WebScraper():
         return publish_date
 
 
-    def extract_job_links(self, job_offers: list, scrape_dates: list) -> list:
+    def extract_job_links(self, dated_job_offers: list, scrape_dates: list) -> list:
         all_links = list()
-        for job in job_offers:
-            publish_date = self.extract_job_publish_date(job)
-
-            if publish_date < self.start_date:
+        for job, publish_date in dated_job_offers:
+            if publish_date < min(scrape_dates):
                 self.running = False
                 return all_links
             if publish_date not in scrape_dates:
@@ -145,164 +428,163 @@ class WebScraper():
             regions = job.find_all('a', class_='offer-regions__label')
             if not regions:     # single location (one link)
                 link_tag = job.find('a', class_='offer-details__title-link')
-                all_links.append({'link': link_tag['href'], 'publish_date': publish_date, 
-                                'regions': []})
+                job_link = {'link': link_tag['href'], 'publish_date': publish_date, 
+                            'regions': []}
             else:               # multiple locations (multiple links)
-                all_links.append({'link': regions[0]['href'], 'publish_date': publish_date, 
-                                'regions': [region.text for region in regions]})
-
-        return all_links
-
-
-    def extract_job_data(self, job: dict, encoding: str='utf-8') -> list:
-        self.driver.get(f"{job['link']}#company-details")
-        self.wait_for_employer_profile(job['link'])
-        job_html = self.driver.page_source
-        job_html = BeautifulSoup(job_html, 'lxml')
+                job_link = {'link': regions[0]['href'], 'publish_date': publish_date, 
+                            'regions': [region.text for region in regions]}
 
+            # Offers scraped in previous runs or already listed on earlier pages are skipped
+            if self.offer_index is not None and not self.offer_index.claim(self.offer_parser.get_offer_id(job_link['link'])):
+                continue
+            all_links.append(job_link)
 
-        basic_job_data = self.get_basic_job_data(job_html, job)
-        categories_data = self.get_categories_data(job_html)
-        employer_data = self.get_employer_data(job_html)
-        data_per_contract = self.get_contract_specific_data(job_html)
-      
-        for contract in data_per_contract:
-            contract += basic_job_data + categories_data + employer_data
-        
-        return data_per_contract
+        return all_links
 
 
-    def wait_for_employer_profile(self, job_link: str, wait_time: int=5) -> None:
+    # Runs on one of the pool's drivers and returns parsed job page and its source. Offers without required tags
+    # or not loaded within the deadline are dropped, offers left when the run budget is exhausted are not marked as scraped
+    # (None is returned for both)
+    def load_job(self, driver: webdriver.Chrome, job: dict) -> tuple:
+        if self.run_deadline.expired():
+            self.run_budget_exhausted = True
+            self.metrics.count('offers_skipped_run_budget')
+            return None
+        try:
+            return self.extract_job_html(job, driver)
+        except (TagNotFoundException, TimeoutException):
+            self.metrics.count('offers_dropped')
+            return None
+
+
+    def extract_job_html(self, job: dict, driver: webdriver.Chrome) -> tuple:
+        job_html = None
+        source = 'http'
+        if self.fetch_mode == 'hybrid':
+            job_html, page_source = self.get_static_soup(job['link'], 'job')
+
+        if job_html is None:
+            source = 'browser'
+            deadline = self.run_deadline.child(self.page_deadline)
+            # Missing tags are not retried, the offer is dropped
+            page_source = self.retry_policy.call('job_load', lambda: self.load_job_page(job, driver, deadline),
+                                                (TimeoutException,), deadline)
+            with self.metrics.timer('html_parse'):
+                job_html = self.html_parser.parse(page_source, 'job')
+
+        if self.page_archive is not None:
+            self.page_archive.add_job_page(job, page_source, source)
+        return job_html, page_source
+
+
+    # Employer profiles of the loaded offers are fetched concurrently, each profile once. Offers whose profile
+    # could not be fetched for now are postponed to the next run and are not marked as scraped.
+    def parse_jobs(self, links: list, loaded_jobs: list) -> list:
+        profile_links = [None if loaded_job is None else self.offer_parser.get_employer_profile_link(*loaded_job) for loaded_job in loaded_jobs]
+        unique_links = list(dict.fromkeys(link for link in profile_links if link is not None))
+        employers_data = dict(zip(unique_links, self.employer_executor.map(self.get_employer_data, unique_links)))
+        # Offers without a profile get no employer data
+        employers_data[None] = [None]*3
+
+        jobs_data = []
+        for job, loaded_job, profile_link in zip(links, loaded_jobs, profile_links):
+            if loaded_job is None:
+                jobs_data.append([])
+            elif employers_data[profile_link] is None:
+                self.postponed_links.add(job['link'])
+                self.metrics.count('offers_postponed')
+                jobs_data.append([])
+            else:
+                self.metrics.count('offers')
+                jobs_data.append(self.offer_parser.parse_job(loaded_job[0], job, employers_data[profile_link]))
+        return jobs_data
+
+
+    def load_job_page(self, job: dict, driver: webdriver.Chrome, deadline: Deadline) -> str:
+        with self.browser_rate.limit():
+            with self.metrics.timer('job_load'):
+                driver.get(f"{job['link']}#company-details")
+            with self.metrics.timer('employer_profile_wait'):
+                if not self.wait_for_tags(driver, 'job', deadline.cap(self.tag_wait_timeout)):
+                    raise TagNotFoundException
+            self.count_browser_page(driver)
+            return driver.page_source
+
+
+    # Returns False if the tag parsed from the page did not load within wait_time seconds
+    def wait_for_tags(self, driver: webdriver.Chrome, page_type: str, wait_time: float=5) -> bool:
         try:
-            dummy = WebDriverWait(self.driver, wait_time).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR,".employer-profile-WcUgc")))
+            WebDriverWait(driver, wait_time).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, self.html_parser.browser_wait_selectors[page_type])))
+            return True
         except TimeoutException:
-            #self.logger.warning(f"Company profile link tag did not load within {wait_time} seconds. Please check if the HTML of the source webpage was changed: {job_link}")
-            raise TagNotFoundException  
-
+            return False
 
-    def get_basic_job_data(self, job_html: BeautifulSoup, job: dict) -> list:
-        job_link = job['link']
-        publish_date = job['publish_date']
-
-        id_start_position = job_link.rfind(',') + 1
-        id_end_position = job_link.find('?', id_start_position)
-        offer_id = job_link[id_start_position:id_end_position]
-
-        if len(job['regions']) > 0:
-            location = '|'.join(job['regions'])
-        else:
-            location_info = job_html.find('div', class_='offer-viewumlDlF').find('div').find_all()
-            location = location_info[0].text
 
+    # Transferred bytes are compared between browser profiles, replayed pages are not transferred
+    def count_browser_page(self, driver: webdriver.Chrome) -> None:
+        self.metrics.count('browser_pages')
+        if self.corpus_mode == 'replay':
+            return
         try:
-            position_title = job_html.find('h1', class_='offer-viewkHIhn3').text
-        except AttributeError:
-            position_title = None
-
-        work_schedule, position_type, work_mode = [None]*3
-        benefit_list = job_html.find_all('div', class_='offer-viewXo2dpV')
-        for element in benefit_list:
-            if element['data-test'] == 'sections-benefit-work-schedule-text':
-                work_schedule = element.text
-            elif element['data-test'] == 'sections-benefit-employment-type-name-text':
-                position_type = element.text
-            elif element['data-test'] == 'sections-benefit-work-modes-text':
-                work_mode = element.text
-
-        return [offer_id, job_link, publish_date, position_title, location, work_schedule, work_mode, position_type]
-
-
-    def get_categories_data(self, job_html: BeautifulSoup) -> list:
-        categories = None
-
-        category_panel = job_html.find('ul', class_='offer-viewEmkiAc')
-        if category_panel is None:
-            return categories
-     
-        category_tiles = category_panel.find_all('li', recursive=False)
-        
-        for index, category in enumerate(category_tiles):
-            if index == 3:    #3 - subcategories
-                categories = category.find('a')['href'][-7:]
-                other_categories = category.find_all('a', class_='offer-vieweWtPBJ')
-                for other_category in other_categories:
-                    categories += ", " + other_category['href'][-7:]
-
-        return [categories]
-
-
-    def get_employer_data(self, job_html: BeautifulSoup, encoding: str='utf-8') -> list:
-        employer_name, employer_address, employer_tax_id = [None]*3
-
-        employer_profile_link = job_html.find('a', class_='employer-profileiHwZjJ')
-        if employer_profile_link is None:
-            employer_profile_link = job_html.find('a', class_='ep-profile-link')
-        
-        if employer_profile_link is None:
-            return [employer_name, employer_address, employer_tax_id]
-
-        employer_profile_link = employer_profile_link['href']
-        employer_html = requests.get(employer_profile_link)
-        employer_html.encoding = encoding
-        employer_html = BeautifulSoup(employer_html.text, 'lxml')
-
-        with self.ignored(AttributeError):
-            employer_name = employer_html.find('div', class_='title-container').find('h1').text
-        with self.ignored(AttributeError):
-            employer_data = employer_html.find('div', class_='box-content').find('div', class_='text')
-            with self.ignored(AttributeError):
-                employer_address = employer_data.find('p', itemprop='address').text
-            with self.ignored(AttributeError):
-                employer_tax_id = employer_data.find('p', itemprop='taxID').text
-    
-        return [employer_name, employer_address, employer_tax_id]
-
-
-    def get_contract_specific_data(self, job_html: BeautifulSoup) -> list:
-        contracts_list = []
-
-        salaries = job_html.find_all('strong', class_='offer-viewLdvtPw')
-        salary_units = job_html.find_all('span', class_='offer-viewSGW6Yi')
-        contracts = job_html.find_all('div', class_='offer-vieweHKpRl')
-
-        if len(contracts) < 1:
-            contracts.append(None)
-            benefit_list = job_html.find_all('div', class_='offer-viewXo2dpV')
-            for element in benefit_list:
-                if element['data-test'] == 'sections-benefit-contracts-text':
-                    contracts[0] = element
-
-        for index, salary in enumerate(salaries):
-            salary_max, salary_min = [None]*2
-
-            with self.ignored(AttributeError):
-                salary_max = salary.find('span', class_='offer-viewYo2KTr').text
-            with self.ignored(AttributeError):
-                salary_min = salary.find('span', class_='offer-viewZGJhIB').text
-            
-            contracts_list.append([contracts[index].text, salary_min, salary_max, salary_units[index].text])
-        
-        if len(contracts_list) < 1:
-            contracts_list = [[None, None, None, None]]
-
-        return contracts_list
-        
+            self.metrics.count('browser_bytes', self.browser_profile.get_transferred_bytes(driver))
+        except WebDriverException:
+            pass
+
+
+    def log_browser_profile_effect(self) -> None:
+        summary = self.metrics.summary()
+        pages = summary['counters'].get('browser_pages', 0)
+        if pages < 1:
+            return
+        load_stages = [summary['stages'][stage] for stage in ['listing_load', 'job_load', 'employer_profile_wait'] if stage in summary['stages']]
+        load_seconds = sum(stage['total_seconds'] for stage in load_stages)
+        self.logger.info(f"{pages} pages were loaded with the {self.browser_profile.name} browser profile: "
+                        f"{load_seconds/pages:.2f} s and {summary['browser_bytes_per_page']/1024:.0f} KB per page on average.")
+
+
+    # Returns None if the profile could not be fetched for now (failing or skipped fetches), so the offer is scraped again
+    # in the next run. Offers with a missing profile (e.g. 404) get no employer data.
+    def get_employer_data(self, employer_profile_link: str) -> list:
+        if self.employer_cache is not None:
+            employer_data = self.employer_cache.get(employer_profile_link)
+            if employer_data is not None:
+                return employer_data
+
+        # Fetches are skipped while the employer profiles are failing
+        if not self.employer_breaker.allow():
+            return None
+        deadline = self.run_deadline.child(self.page_deadline)
+        try:
+            employer_html = self.retry_policy.call('employer_fetch', lambda: self.fetch_employer_profile(employer_profile_link, deadline),
+                                                HttpFetcher.congestion_errors, deadline)
+        except DeadlineExpiredError:
+            self.logger.warning(f'Employer profile was not fetched within the page deadline: {employer_profile_link}')
+            return None
+        except HttpFetcher.congestion_errors:
+            self.employer_breaker.record_failure()
+            self.logger.warning(f'Employer profile could not be fetched: {employer_profile_link}')
+            return None
+        except HttpFetcher.errors:
+            self.employer_breaker.record_success()
+            self.logger.warning(f'Employer profile could not be fetched: {employer_profile_link}')
+            return [None]*3
+        else:
+            self.employer_breaker.record_success()
+        finally:
+            # Half-open trial which ended without an outcome must not keep the circuit half-open
+            self.employer_breaker.release()
 
-    def write_to_df(self, data: list) -> pd.DataFrame:
-        output = StringIO()
-        csv_writer = writer(output)
-        for row in data:
-            csv_writer.writerow(row)
+        if self.page_archive is not None:
+            self.page_archive.add_employer_page(employer_profile_link, employer_html)
+        employer_data = self.offer_parser.parse_employer_profile(employer_html)
+        # Profile without any parsed field (e.g. a changed or error page) is fetched again for the next offer
+        if self.employer_cache is not None and any(value is not None for value in employer_data):
+            self.employer_cache.put(employer_profile_link, employer_data)
 
-        output.seek(0) # we need to get back to the start of the StringIO
-        df = pd.read_csv(output)
-        return df
+        return employer_data
 
 
-    @contextmanager
-    def ignored(self, *exceptions):
-        try:
-            yield
-        except exceptions:
-            pass
\ No newline at end of file
+    def fetch_employer_profile(self, employer_profile_link: str, deadline: Deadline) -> str:
+        with self.http_rate.limit(), self.metrics.timer('employer_fetch'):
+            return self.http_fetcher.get(employer_profile_link, deadline.remaining())
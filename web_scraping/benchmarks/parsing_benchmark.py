@@ -0,0 +1,131 @@
+# Compares parse time per page of the full-tree parsing used before HtmlParser with the strained parsing.
+# Pages are generated to resemble the structure of pracuj.pl listing, job and employer pages.
+# Parsed tags have more than one class like on the site, which the strainers have to keep.
+# Run from the web_scraping directory: python -m benchmarks.parsing_benchmark
+from app.web_scraping.scraper import WebScraper
+from app.web_scraping.html_parser import HtmlParser
+from app.web_scraping.offer_parser import OfferParser
+from bs4 import BeautifulSoup
+from datetime import date
+import timeit
+import yaml
+
+
+def generate_filler(blocks: int=300) -> str:
+    block = '<div class="nav-item"><a href="/x"><span>menu</span></a><ul><li>a</li><li>b</li><li>c</li></ul></div>'
+    script = '<script>window.__data = {"a": [1, 2, 3], "b": "text"};</script>'
+    return script*20 + block*blocks
+
+
+def generate_listing_page(offers: int=50) -> str:
+    offer = ('<li class="results__list-container-item"><div class="offer">'
+            '<a class="offer-details__title-link" href="https://www.pracuj.pl/praca/analityk,oferta,{id}?s=1">Analityk</a>'
+            '<span class="offer-actions__date"><b>Opublikowana:</b><b> </b>24 kwi<b> </b>2022\n</span>'
+            '</div></li>')
+    results = ''.join(offer.format(id=1001000000+index) for index in range(offers))
+    return (f'<html><body>{generate_filler()}<div class="results"><ul>{results}</ul></div>'
+            '<ul class="pagination"><li class="pagination_element pagination_element--next"><a href="#">next</a></li></ul>'
+            f'{generate_filler()}</body></html>')
+
+
+def generate_job_page() -> str:
+    return ('<html><body>' + generate_filler() +
+            '<h1 class="offer-viewkHIhn3 css-1x2y3z">Analityk danych</h1>'
+            '<div class="offer-viewumlDlF css-1x2y3z"><div><span>ul. Prosta 1, Warszawa</span></div></div>'
+            '<div class="offer-viewXo2dpV css-1x2y3z" data-test="sections-benefit-work-schedule-text">pełny etat</div>'
+            '<div class="offer-viewXo2dpV css-1x2y3z" data-test="sections-benefit-employment-type-name-text">specjalista</div>'
+            '<div class="offer-viewXo2dpV css-1x2y3z" data-test="sections-benefit-work-modes-text">praca hybrydowa</div>'
+            '<ul class="offer-viewEmkiAc css-1x2y3z"><li><a href="/a">a</a></li><li><a href="/b">b</a></li><li><a href="/c">c</a></li>'
+            '<li><a href="/praca/5015001">IT</a><a class="offer-vieweWtPBJ" href="/praca/5015002">BI</a></li></ul>'
+            '<div class="employer-profile-WcUgc css-1x2y3z"><a class="employer-profileiHwZjJ css-1x2y3z" href="https://pracodawcy.pracuj.pl/company/1">profil</a></div>'
+            '<div class="offer-vieweHKpRl css-1x2y3z">umowa o pracę</div>'
+            '<strong class="offer-viewLdvtPw css-1x2y3z"><span class="offer-viewZGJhIB">8\xa0000–</span><span class="offer-viewYo2KTr">12\xa0000 zł</span></strong>'
+            '<span class="offer-viewSGW6Yi css-1x2y3z">brutto / mies.</span>' +
+            generate_filler() + '</body></html>')
+
+
+def generate_employer_page() -> str:
+    return ('<html><body>' + generate_filler() +
+            '<div class="title-container header"><h1>Firma sp. z o.o.</h1></div>'
+            '<div class="box-content box"><div class="text"><p itemprop="address">ul. Prosta 1\n00-001 Warszawa</p>'
+            '<p itemprop="taxID">NIP: 1234567890</p></div></div>' +
+            generate_filler() + '</body></html>')
+
+
+# Scraper with only the attributes used by the parsing methods (no browser is started)
+def get_scraper() -> WebScraper:
+    config = yaml.safe_load(open('./configs/web-scraping-config.yml'))
+    scraper = WebScraper.__new__(WebScraper)
+    scraper.month_names = config['scraper']['month_names']
+    scraper.html_parser = HtmlParser()
+    return scraper
+
+
+# Returns publish dates of the offers and whether the page has the next page button
+def parse_listing_before(scraper: WebScraper, html: str) -> tuple:
+    soup = BeautifulSoup(html, 'lxml')
+    job_offers = soup.find('div', class_='results').find_all(
+            lambda tag: tag.name == 'li' and tag.get('class') == ['results__list-container-item'])
+    scraper.extract_job_publish_date(job_offers[-1])
+    next_button = soup.find('li', class_='pagination_element pagination_element--next')
+    return [scraper.extract_job_publish_date(job) for job in job_offers], next_button is not None
+
+
+def parse_listing_after(scraper: WebScraper, html: str) -> tuple:
+    soup = scraper.html_parser.parse(html, 'listing')
+    next_button = soup.find('li', class_='pagination_element pagination_element--next')
+    return [publish_date for job, publish_date in scraper.get_dated_job_offers(soup)], next_button is not None
+
+
+def extract_job(offer_parser: OfferParser, job_html: BeautifulSoup) -> list:
+    job = {'link': 'https://www.pracuj.pl/praca/analityk,oferta,1001000000?s=1', 'publish_date': date(2022, 4, 24), 'regions': []}
+    return offer_parser.parse_job(job_html, job, [])
+
+
+# Data parsed from the generated pages, so that both parsers are checked and not only compared
+expected_results = {
+    'listing': ([date(2022, 4, 24)]*50, True),
+    'job': [['umowa o pracę', '8\xa0000–', '12\xa0000 zł', 'brutto / mies.', '1001000000',
+            'https://www.pracuj.pl/praca/analityk,oferta,1001000000?s=1', date(2022, 4, 24), 'Analityk danych',
+            'ul. Prosta 1, Warszawa', 'pełny etat', 'praca hybrydowa', 'specjalista', '5015001, 5015002']],
+    'employer': ['Firma sp. z o.o.', 'ul. Prosta 1\n00-001 Warszawa', 'NIP: 1234567890'],
+}
+
+
+def run(repeat: int=20) -> None:
+    scraper = get_scraper()
+    offer_parser = OfferParser(scraper.html_parser)
+    pages = {'listing': generate_listing_page(), 'job': generate_job_page(), 'employer': generate_employer_page()}
+
+    cases = {
+        'listing': (lambda: parse_listing_before(scraper, pages['listing']),
+                    lambda: parse_listing_after(scraper, pages['listing'])),
+        'job': (lambda: extract_job(offer_parser, BeautifulSoup(pages['job'], 'lxml')),
+                lambda: extract_job(offer_parser, offer_parser.html_parser.parse(pages['job'], 'job'))),
+        'employer': (lambda: offer_parser.parse_employer_profile(pages['employer']),
+                    lambda: offer_parser.parse_employer_profile(pages['employer'])),
+    }
+    # parse_employer_profile uses the strainer, the full tree is measured by bypassing the parser
+    full_parser = HtmlParser()
+    full_parser.parse = lambda html, page_type: BeautifulSoup(html, 'lxml')
+
+    print(f'{"page":<10}{"before [ms]":>14}{"after [ms]":>14}{"speedup":>10}')
+    for page_type, (before, after) in cases.items():
+        if page_type == 'employer':
+            offer_parser.html_parser = full_parser
+        before_result = before()
+        before_time = min(timeit.repeat(before, number=1, repeat=repeat))
+        offer_parser.html_parser = HtmlParser()
+        after_result = after()
+        after_time = min(timeit.repeat(after, number=1, repeat=repeat))
+
+        assert before_result == expected_results[page_type], f'Full tree {page_type} data is wrong: {before_result}'
+        assert after_result == expected_results[page_type], f'Strained {page_type} data is wrong: {after_result}'
+        if page_type == 'job':
+            employer_link = offer_parser.get_employer_profile_link(offer_parser.html_parser.parse(pages['job'], 'job'))
+            assert employer_link == 'https://pracodawcy.pracuj.pl/company/1', f'Employer profile link is wrong: {employer_link}'
+        print(f'{page_type:<10}{before_time*1000:>14.2f}{after_time*1000:>14.2f}{before_time/after_time:>9.1f}x')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,57 @@
+# Replays a recorded page corpus through WebScraper and reports offers per second and peak memory.
+# Record the corpus by running the scraper with corpus_mode: 'record', then run from the web_scraping directory:
+# python -m benchmarks.replay_benchmark --corpus-dir ./corpus/ --driver-pool-size 4 --fetch-mode hybrid
+from app.common.local_bucket import LocalBucketConnector
+from app.web_scraping.scraper import WebScraper
+from app.web_scraping.page_corpus import PageCorpus
+from tempfile import TemporaryDirectory
+import argparse
+import resource
+import time
+import yaml
+
+
+def run(corpus_dir: str, corpus_path: str, driver_pool_size: int, fetch_mode: str, config_path: str) -> dict:
+    config = yaml.safe_load(open(config_path))
+    scraper_config = dict(config['scraper'])
+    manifest = PageCorpus(LocalBucketConnector(corpus_dir, ''), corpus_path).load_manifest()
+
+    # Rates are not limited, so that only the scraper itself is measured
+    unlimited = {'latency_target': 60, 'initial_rate': 10000, 'max_rate': 10000,
+                'initial_concurrency': driver_pool_size, 'max_concurrency': driver_pool_size}
+    scraper_config.update({
+        'source_link': manifest['source_link'], 'start_date': manifest['start_date'], 'end_date': manifest['end_date'],
+        'driver_pool_size': driver_pool_size, 'fetch_mode': fetch_mode,
+        'rate_control': {'browser': unlimited, 'http': dict(unlimited, max_concurrency=scraper_config.get('http_max_connections', 10))},
+        'metrics_file_path': '', 'corpus_mode': 'replay', 'corpus_path': corpus_path, 'corpus_local_dir': corpus_dir})
+    meta_config = {key: value for key, value in config['meta'].items() if key != 'shard_lease_prefix'}
+
+    with TemporaryDirectory() as bucket_dir:
+        bucket = LocalBucketConnector(bucket_dir, config['s3']['target_path'])
+        scraper = WebScraper(target_bucket=bucket, **scraper_config, **meta_config)
+        start = time.perf_counter()
+        try:
+            scraper.scrape()
+        finally:
+            scraper.quit()
+        elapsed = time.perf_counter() - start
+
+    counters = scraper.metrics.summary()['counters']
+    return {'offers': counters.get('offers', 0), 'offers_dropped': counters.get('offers_dropped', 0),
+            'seconds': elapsed, 'offers_per_second': counters.get('offers', 0) / elapsed,
+            # ru_maxrss is given in kilobytes on Linux
+            'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay benchmark of the web scraper.')
+    parser.add_argument('--corpus-dir', required=True, help='Local directory with the recorded corpus')
+    parser.add_argument('--corpus-path', default='pracuj-pl/corpus/', help='Prefix of the corpus within the directory')
+    parser.add_argument('--driver-pool-size', type=int, default=1)
+    parser.add_argument('--fetch-mode', default='hybrid', choices=['browser', 'hybrid'])
+    parser.add_argument('--config', default='./configs/web-scraping-config.yml')
+    args = parser.parse_args()
+
+    result = run(args.corpus_dir, args.corpus_path, args.driver_pool_size, args.fetch_mode, args.config)
+    print(f"{result['offers']} offers ({result['offers_dropped']} dropped) in {result['seconds']:.2f} s: "
+        f"{result['offers_per_second']:.2f} offers/s, peak memory {result['peak_memory_mb']:.0f} MB")
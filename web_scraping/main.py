@@ -29,7 +29,7 @@ def run():
         logger.error('Due to raised error the program will be terminated.')
     except Exception:
         logger.exception('An unexpected error has occured. The program will be terminated.')
-    scraper.driver.quit()
+    scraper.quit()
     
 
 if __name__ == '__main__':
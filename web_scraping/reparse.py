@@ -0,0 +1,46 @@
+from app.common.s3 import S3BucketConnector
+from app.web_scraping.archive_reparser import ArchiveReparser
+from app.common.custom_exceptions import CustomException
+from datetime import datetime
+import argparse
+import yaml
+import logging
+import logging.config
+
+
+# Rebuilds data files of offers published in the date range from the page archive, e.g.:
+# python reparse.py --start-date 2022-04-24 --end-date 2022-05-01
+# Files are written to the reparse target path, so they are not picked up by the transformer until moved to the target path
+def run():
+    parser = argparse.ArgumentParser(description='Reparse archived pages into data files.')
+    parser.add_argument('--start-date', required=True)
+    parser.add_argument('--end-date', required=True, help='End date (excluded)')
+    args = parser.parse_args()
+
+    config_path = './configs/web-scraping-config.yml'
+    config = yaml.safe_load(open(config_path))
+
+    log_config = config['logging']
+    logging.config.dictConfig(log_config)
+    logger = logging.getLogger(__name__)
+    logger.info('Reparsing started.')
+
+    try:
+        s3_config = dict(config['s3'], target_path=config['reparse']['target_path'])
+        scraper_config = config['scraper']
+        date_format = scraper_config.get('date_format', '%Y-%m-%d')
+        start_date = datetime.strptime(args.start_date, date_format).date()
+        end_date = datetime.strptime(args.end_date, date_format).date()
+
+        bucket_connector = S3BucketConnector(**s3_config)
+        reparser = ArchiveReparser(bucket_connector, scraper_config['column_headers'], config['meta']['archive_path'],
+                                scraper_config.get('target_file_format', 'parquet'), scraper_config['rows_per_part'])
+        reparser.reparse(start_date, end_date)
+    except CustomException:
+        logger.error('Due to raised error the program will be terminated.')
+    except Exception:
+        logger.exception('An unexpected error has occured. The program will be terminated.')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,121 @@
+from app.web_scraping.http_fetcher import HttpFetcher, ServerBusyError, DeadlineExpiredError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock
+import requests
+import time
+import unittest
+
+
+# Local server: /slow answers after a second, /busy with 503, /missing with 404, other paths after a short wait.
+# Requests handled at the same time are counted.
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path == '/slow':
+                time.sleep(1)
+            elif self.path not in ('/busy', '/missing'):
+                time.sleep(0.1)
+            status = {'/busy': 503, '/missing': 404}.get(self.path, 200)
+            body = f'strona {self.path}'.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:     # client stopped waiting (timeout)
+            pass
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class HttpFetcherTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+        self.server.daemon_threads = True
+        self.server.lock = Lock()
+        self.server.requests = 0
+        self.server.active = 0
+        self.server.max_active = 0
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.fetcher = HttpFetcher(max_connections=8, max_connections_per_host=2, timeout=0.5)
+
+
+    def tearDown(self) -> None:
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def test_get(self) -> None:
+        self.assertEqual(self.fetcher.get(f'{self.base_url}/page'), 'strona /page')
+
+
+    def test_timeout(self) -> None:
+        start = time.monotonic()
+        with self.assertRaises(HttpFetcher.congestion_errors):
+            self.fetcher.get(f'{self.base_url}/slow')
+        self.assertLess(time.monotonic() - start, 1)
+
+
+    # Timeout of the request is shortened to the remaining time of its deadline
+    def test_shortened_timeout(self) -> None:
+        fetcher = HttpFetcher(timeout=10)
+        try:
+            start = time.monotonic()
+            with self.assertRaises(HttpFetcher.congestion_errors):
+                fetcher.get(f'{self.base_url}/slow', 0.2)
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            fetcher.close()
+
+
+    def test_expired_deadline(self) -> None:
+        with self.assertRaises(DeadlineExpiredError):
+            self.fetcher.get(f'{self.base_url}/page', 0)
+        self.assertNotIsInstance(DeadlineExpiredError(), HttpFetcher.congestion_errors)
+        self.assertEqual(self.server.requests, 0)
+
+
+    def test_concurrency_limit_per_host(self) -> None:
+        urls = [f'{self.base_url}/page{number}' for number in range(6)]
+        pages = self.fetcher.get_all(urls)
+        self.assertEqual(pages, [f'strona /page{number}' for number in range(6)])
+        self.assertEqual(self.server.max_active, 2)
+
+
+    # Request which timed out keeps its slot of the host until the worker thread finishes
+    def test_timed_out_request_keeps_host_slot(self) -> None:
+        fetcher = HttpFetcher(max_connections=8, max_connections_per_host=1, timeout=10)
+        try:
+            # Worker thread of the first request is stuck (e.g. in name resolution) longer than its timeout
+            request = fetcher.request
+            fetcher.request = lambda url, timeout: (time.sleep(1) if url.endswith('/stuck') else None) or request(url, timeout)
+            with self.assertRaises(HttpFetcher.congestion_errors):
+                fetcher.get(f'{self.base_url}/stuck', 0.2)
+            start = time.monotonic()
+            self.assertEqual(fetcher.get(f'{self.base_url}/page'), 'strona /page')
+            self.assertGreater(time.monotonic() - start, 0.5)
+        finally:
+            fetcher.close()
+
+
+    def test_errors(self) -> None:
+        pages = self.fetcher.get_all([f'{self.base_url}/busy', f'{self.base_url}/missing', f'{self.base_url}/page'])
+        self.assertIsInstance(pages[0], ServerBusyError)
+        self.assertIsInstance(pages[1], requests.HTTPError)
+        self.assertNotIsInstance(pages[1], HttpFetcher.congestion_errors)
+        self.assertEqual(pages[2], 'strona /page')
+
+
+if __name__ == '__main__':
+    unittest.main()
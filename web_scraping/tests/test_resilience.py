@@ -0,0 +1,48 @@
+from app.web_scraping.resilience import CircuitBreaker
+import time
+import unittest
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.05)
+
+
+    def open_circuit(self) -> None:
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+        time.sleep(0.06)
+
+
+    def test_trial_success_closes_the_circuit(self) -> None:
+        self.open_circuit()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+
+    def test_trial_failure_opens_the_circuit(self) -> None:
+        self.open_circuit()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+
+    # Trial without an outcome (e.g. its deadline expired) lets the next call be the trial
+    def test_released_trial(self) -> None:
+        self.open_circuit()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, 'half-open')
+
+
+if __name__ == '__main__':
+    unittest.main()
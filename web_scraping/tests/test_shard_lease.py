@@ -0,0 +1,90 @@
+from app.common.local_bucket import LocalBucketConnector
+from app.common.shard_lease import ShardLease
+from datetime import date, datetime, timedelta, timezone
+import tempfile
+import unittest
+
+
+# Two pods share leases through a bucket kept in a temporary directory
+class ShardLeaseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root_dir = tempfile.TemporaryDirectory()
+        bucket = LocalBucketConnector(self.root_dir.name, '')
+        self.pod_a = ShardLease(bucket, 'leases/', shard_days=2, ttl_minutes=60)
+        self.pod_b = ShardLease(bucket, 'leases/', shard_days=2, ttl_minutes=60)
+
+
+    def tearDown(self) -> None:
+        self.root_dir.cleanup()
+
+
+    def test_claim(self) -> None:
+        self.assertTrue(self.pod_a.claim('shard'))
+        self.assertFalse(self.pod_b.claim('shard'))
+        self.assertTrue(self.pod_a.claim('shard'))
+        self.assertEqual(self.pod_a.read_lease('shard')[0]['owner'], self.pod_a.owner)
+
+
+    def test_renew(self) -> None:
+        self.pod_a.write_lease('shard', datetime.now(timezone.utc) + timedelta(seconds=1))
+        self.pod_a.renew('shard')
+        expires_at = datetime.fromisoformat(self.pod_a.read_lease('shard')[0]['expires_at'])
+        self.assertGreater(expires_at, datetime.now(timezone.utc) + timedelta(minutes=59))
+        self.assertFalse(self.pod_b.claim('shard'))
+
+
+    # Lease of a pod which stopped renewing it is taken over by another pod
+    def test_expired_lease_is_taken_over(self) -> None:
+        self.pod_a.write_lease('shard', datetime.now(timezone.utc) - timedelta(seconds=1))
+        self.assertTrue(self.pod_b.claim('shard'))
+        self.assertFalse(self.pod_a.claim('shard'))
+
+
+    # Of the pods which read the same expired lease only the first one takes it over
+    def test_expired_lease_is_taken_over_by_one_pod(self) -> None:
+        self.pod_a.write_lease('shard', datetime.now(timezone.utc) - timedelta(seconds=1))
+        _, etag = self.pod_a.read_lease('shard')
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=60)
+        self.assertTrue(self.pod_b.write_lease('shard', expires_at, etag))
+        self.assertFalse(self.pod_a.write_lease('shard', expires_at, etag))
+        self.assertEqual(self.pod_a.read_lease('shard')[0]['owner'], self.pod_b.owner)
+
+
+    def test_lease_taken_over_is_not_renewed(self) -> None:
+        self.pod_a.write_lease('shard', datetime.now(timezone.utc) - timedelta(seconds=1))
+        self.assertTrue(self.pod_b.claim('shard'))
+        self.assertFalse(self.pod_a.renew('shard'))
+        self.pod_a.release('shard')
+        self.assertEqual(self.pod_a.read_lease('shard')[0]['owner'], self.pod_b.owner)
+        self.assertFalse(self.pod_a.claim('shard'))
+
+
+    # Leases written with the expiry time without a time zone are read as UTC
+    def test_lease_without_time_zone(self) -> None:
+        expires_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+        self.assertTrue(self.pod_a.is_expired({'owner': self.pod_b.owner, 'expires_at': expires_at.isoformat()}))
+
+
+    def test_release(self) -> None:
+        self.assertTrue(self.pod_a.claim('shard'))
+        self.pod_a.release('shard')
+        self.assertTrue(self.pod_a.is_expired(self.pod_a.read_lease('shard')[0]))
+        self.assertTrue(self.pod_b.claim('shard'))
+
+
+    def test_shards_are_claimed_by_one_pod(self) -> None:
+        scrape_dates = [date(2022, 4, 26) - timedelta(days=day) for day in range(5)]
+        shards_a = dict(self.pod_a.claim_shards(scrape_dates))
+        shards_b = dict(self.pod_b.claim_shards(scrape_dates))
+        self.assertEqual(list(shards_a), ['20220425_20220426', '20220423_20220424', '20220422_20220422'])
+        self.assertEqual(shards_b, {})
+
+
+    def test_lock(self) -> None:
+        with self.pod_a.lock('metafile'):
+            self.assertFalse(self.pod_b.claim('metafile'))
+        self.assertTrue(self.pod_b.claim('metafile'))
+
+
+if __name__ == '__main__':
+    unittest.main()